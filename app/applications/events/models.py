@@ -1,6 +1,10 @@
+from typing import Optional
 from tortoise import fields
 
 from app.core.base.models import BaseCreatedAtModel, LocationModel, BaseDBModel, MediaModel
+from app.applications.organisations.models import Club
+from app.core.base.context import load, memoize
+from app.core.base.db import register_schema
 
 
 class Event(BaseDBModel, BaseCreatedAtModel, LocationModel, MediaModel):
@@ -32,28 +36,42 @@ class Event(BaseDBModel, BaseCreatedAtModel, LocationModel, MediaModel):
     )
 
     async def is_host(self, user) -> bool:
-        await self.fetch_related("host_club")
-        if self.host_club:
-            status = await self.host_club.membership_status(user)
-            return status == 1
-        return self.host_user_id == user.id
+        if self.host_club_id:
+            host_club = await load(Club, self.host_club_id)
+            return host_club is not None and await host_club.membership_status(user) == 1
+        return user is not None and self.host_user_id == user.id
+
+    async def attendance(self, user) -> Optional[bool]:
+        """
+        is_verified flag of the user's attendance, None if the user does not attend
+        """
+        if user is None:
+            return None
+        return await memoize(
+            ("attendance", self.id, user.id),
+            lambda: Attendee.filter(event_id=self.id, user_id=user.id).first().values_list("is_verified", flat=True)
+        )
 
     async def can_post(self, user) -> bool:
-        try:
-            return await self.is_host(user) or (await Attendee.get(event=self, user=user)).is_verified
-        except Exception:
-            return False
+        return await self.is_host(user) or bool(await self.attendance(user))
 
     async def can_rate(self, user) -> bool:
-        try:
-            return (await Attendee.get(event=self, user=user)).is_verified
-        except Exception:
-            return False
+        return bool(await self.attendance(user))
+
+
+register_schema('CREATE INDEX IF NOT EXISTS "idx_events_start_end" ON "events" ("start_date", "end_date");')
+register_schema('CREATE INDEX IF NOT EXISTS "idx_events_end_date" ON "events" ("end_date");')
+# the month view matches days against this range expression
+register_schema(
+    'CREATE INDEX IF NOT EXISTS "idx_events_period" ON "events" USING gist '
+    '(tstzrange("start_date", greatest("start_date", "end_date"), \'[]\'));'
+)
 
 
 class Attendee(BaseDBModel):
     class Meta:
         table = "attendees"
+        unique_together = (("event", "user"), )
 
     class PydanticMeta:
         backward_relations = False
@@ -66,3 +84,18 @@ class Attendee(BaseDBModel):
     user: fields.ForeignKeyRelation = fields.ForeignKeyField(
         "models.User", related_name="attendance"
     )
+
+
+# tables created before the constraint existed may hold duplicate rows, keep the verified or oldest one
+register_schema('''
+DO $$ BEGIN
+IF NOT EXISTS (
+    SELECT 1 FROM pg_indexes WHERE tablename = 'attendees' AND indexdef LIKE 'CREATE UNIQUE INDEX % (event_id, user_id)'
+) THEN
+    DELETE FROM "attendees" AS "duplicate" USING "attendees" AS "kept"
+    WHERE "duplicate"."event_id" = "kept"."event_id" AND "duplicate"."user_id" = "kept"."user_id"
+        AND ("duplicate"."is_verified", "kept"."id") < ("kept"."is_verified", "duplicate"."id");
+    CREATE UNIQUE INDEX "uidx_attendees_event_user" ON "attendees" ("event_id", "user_id");
+END IF;
+END $$;
+''')
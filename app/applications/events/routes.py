@@ -1,21 +1,29 @@
 from jose.exceptions import ExpiredSignatureError, JWTClaimsError, JWTError
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from fastapi.responses import RedirectResponse
-from tortoise.expressions import Q
+from tortoise.exceptions import IntegrityError, DoesNotExist
 from datetime import timezone
+from typing import Optional
+import pytz
 
 from app.core.auth.utils.contrib import get_current_active_user, get_current_active_user_optional
 from .schemas import EventOut, EventCreate, EventUpdate, AttendeeOut, AttendeeCreate
 from app.core.base.utils import get_object_or_404, has_permission
-from app.core.auth.utils.jwt import encode_jwt, decode_jwt
+from app.core.auth.utils.jwt import encode_jwt
+from app.applications.interactions.utils import add_tags, set_tags
 from app.applications.interactions.schemas import RateItem
-from app.applications.interactions.models import Tag, Rate
+from app.applications.interactions.models import Rate
+from app.applications.organisations.utils import update_club_stats
 from app.applications.organisations.models import Club
-from .utils import EventFilter, AttendeeFilter
+from .utils import EventFilter, AttendeeFilter, schedule_event_reminder, month_view, toggle_attendance
+from .utils import verification_event, verify_attendance, toggle_verification, event_club_stats
 from app.applications.users.models import User
 from app.core.base.paginator import Paginator
+from app.core.base.permissions import invalidate_roles
 from app.core.base.extractor import Extractor
-from .models import Event, Attendee
+from app.core.scheduler.utils import cancel
+from app.settings import config
+from .models import Event
 
 router = APIRouter()
 
@@ -29,6 +37,19 @@ async def get_events(
     return await paginator(events, EventOut, current_user)
 
 
+@router.get("/calendar/", tags=["events"], status_code=200)
+async def get_calendar(
+    year: int = Query(..., ge=1970, le=9999),
+    month: int = Query(..., ge=1, le=12),
+    tz: str = config.CALENDAR_TIMEZONE,
+    category: Optional[int] = None,
+    host_club: Optional[int] = None,
+):
+    if tz not in pytz.all_timezones_set:
+        raise HTTPException(status_code=400, detail="Unknown timezone")
+    return await month_view(year, month, tz, category, host_club)
+
+
 @router.get("/{id}/", tags=["events"], status_code=200)
 async def get_event(
     id: int,
@@ -45,7 +66,7 @@ async def create_event(
 ):
     if data.host_club_id:
         club: Club = await get_object_or_404(Club, id=data.host_club_id)
-        has_permission(club.is_admin, current_user)
+        await has_permission(club.is_admin, current_user)
 
     extractor = Extractor(data)
     urls, media_dict = extractor.media_files()
@@ -53,10 +74,11 @@ async def create_event(
     event_dict["media_dict"] = media_dict
 
     event = await Event.create(**event_dict, host_user=current_user)
+    invalidate_roles(current_user.id)
 
-    await Tag.bulk_create(
-        Tag(name=name, item_id=event.id, item_type="Event") for name in data.tags
-    )
+    await add_tags("Event", event.id, data.tags)
+    await update_club_stats(event.host_club_id, events=1)
+    await schedule_event_reminder(event)
     return {"created": await EventOut.serialize(event, current_user), "media_upload": urls}
 
 
@@ -74,12 +96,17 @@ async def update_event(
     event_dict = data.dict(exclude_none=True, exclude=["media"])
     event_dict["media_dict"] = media_dict
 
+    previous_club_id = event.host_club_id
     await event.update_from_dict(event_dict).save()
+    if event.host_club_id != previous_club_id:
+        stats = await event_club_stats(event)
+        await update_club_stats(previous_club_id, **{key: -value for key, value in stats.items()})
+        await update_club_stats(event.host_club_id, **stats)
+    if data.start_date is not None:
+        await schedule_event_reminder(event)
 
     if data.tags is not None:
-        await Tag.filter(Q(item_id=id, item_type="Event") & ~Q(name__in=data.tags)).delete()
-        for tag in data.tags:
-            await Tag.get_or_create(name=tag, item_id=id, item_type="Event")
+        await set_tags("Event", id, data.tags)
     return {"updated": await EventOut.serialize(event, current_user), "media_upload": urls}
 
 
@@ -91,7 +118,10 @@ async def delete_event(
     event: Event = await get_object_or_404(Event, id=id)
     await has_permission(event.is_host, current_user)
 
+    await cancel(f"event_reminder:{event.id}")
+    stats = await event_club_stats(event)
     await event.delete()
+    await update_club_stats(event.host_club_id, **{key: -value for key, value in stats.items()})
     return event
 
 
@@ -105,10 +135,13 @@ async def rate_event(
     await has_permission(event.can_rate, current_user)
     try:
         rate_obj = await current_user.rates.filter(item_id=event.id, item_type="Event").get()
+        previous = rate_obj.rate
         rate_obj.rate = rate.rate
         await rate_obj.save()
-    except Exception:
+        await update_club_stats(event.host_club_id, rate_sum=rate.rate - previous)
+    except DoesNotExist:
         rate_obj = await Rate.create(item_id=event.id, item_type="Event", rate=rate.rate, rater=current_user)
+        await update_club_stats(event.host_club_id, rate_sum=rate.rate, rates=1)
     return rate_obj
 
 
@@ -119,21 +152,7 @@ async def attend(
     current_user: User = Depends(get_current_active_user),
 ):
     event: Event = await get_object_or_404(Event, id=id)
-    if await event.attendees.filter(id=current_user.id).exists():
-        await event.attendees.remove(current_user)
-        return False
-    if event.form:
-        if form_data is None or form_data == dict():
-            raise HTTPException(
-                status_code=400,
-                detail="Form is needed"
-            )
-    await Attendee.create(
-        form_data=form_data.dict().get("form_data", None),
-        user=current_user,
-        event=event
-    )
-    return True
+    return await toggle_attendance(event, current_user.id, form_data.form_data if form_data else None)
 
 
 @router.post("/{id}/verify_user/{user_id}/", tags=["events"], status_code=200)
@@ -145,10 +164,10 @@ async def verify_user(
     event: Event = await get_object_or_404(Event, id=id)
     await has_permission(event.is_host, current_user)
 
-    attendee: Attendee = await get_object_or_404(Attendee, user_id=user_id, event_id=id)
-    attendee.is_verified = not attendee.is_verified
-    await attendee.save()
-    return {"verification status": attendee.is_verified}
+    is_verified = await toggle_verification(id, user_id)
+    if is_verified is None:
+        raise HTTPException(status_code=404, detail="Attendee not found")
+    return {"verification status": is_verified}
 
 
 @router.get("/{id}/verify/", tags=["events"], status_code=200)
@@ -176,21 +195,17 @@ async def verify(
     if not current_user:
         return RedirectResponse(url=f"/api/auth/login/?redirect_url=/api/events/verify/{token}")  # TODO: implement this login url with redirect capabilities
     try:
-        payload = decode_jwt(token)
+        event_id, host_club_id = await verification_event(token)
     except ExpiredSignatureError:
-        return HTTPException(status_code=401, detail="link has been expired")
+        raise HTTPException(status_code=401, detail="link has been expired")
     except JWTClaimsError:
-        return HTTPException(status_code=401, detail="link has not been activated")
+        raise HTTPException(status_code=401, detail="link has not been activated")
     except JWTError:
-        return HTTPException(status_code=401, detail="link is wrong")
-    event: Event = await get_object_or_404(Event, id=payload["id"])
-    attend: Attendee = await Attendee.get_or_none(event=event, user=current_user)
-    if attend:
-        attend.is_verified = True
-        await attend.save()
-    else:
-        attend: Attendee = await Attendee.create(event=event, user=current_user, is_verified=True)
-    return attend
+        raise HTTPException(status_code=401, detail="link is wrong")
+    try:
+        return await verify_attendance(event_id, host_club_id, current_user.id)
+    except IntegrityError:
+        raise HTTPException(status_code=404, detail="Event not found")
 
 
 @router.get("/attendee/forms/", tags=["events"], status_code=200)
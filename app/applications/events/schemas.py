@@ -4,10 +4,14 @@ from pydantic import BaseModel, Field
 from tortoise.functions import Avg
 from datetime import datetime
 from typing import Optional
+import asyncio
 import pytz
 
 from app.applications.interactions.models import Tag, Rate
-from app.core.base.schemas import BaseOutSchema
+from app.core.base.schemas import BaseOutSchema, field_group
+from app.applications.interactions.utils import user_rate
+from app.core.base.permissions import viewer_roles
+from app.core.base.context import load, loader
 from .models import Event, Attendee
 
 
@@ -29,7 +33,7 @@ class EventOut(BaseOutSchema):
 
     @staticmethod
     async def allowed_actions(item: Event, user, is_host):
-        is_verified_attendee = bool(user) and await item.can_post(user)
+        is_verified_attendee = bool(user) and (is_host or bool((await viewer_roles(user)).attendance(item.id)))
         can_attend = bool(user) and item.end_date > datetime.now(pytz.utc)
         return {
             "can_edit": is_host,
@@ -41,34 +45,56 @@ class EventOut(BaseOutSchema):
         }
 
     @classmethod
-    async def add_fields(cls, item: Event, user):
-        item = await Event.annotate(
-            attendee_count=Subquery(item.attendees.all().count()),
-            rate_count=Subquery(Rate.filter(item_id=item.id, item_type="Event").count())
-        ).prefetch_related("host_club").get(id=item.id)
-        user_rate = await Rate.get_or_none(item_id=item.id, item_type="Event")
-        is_attending = bool(user) and await item.attendees.filter(id=user.id).exists()
-        is_host = bool(user) and await item.is_host(user)
+    async def prefetch(cls, items: list[Event], user):
+        if cls.wants("request_data"):
+            await viewer_roles(user)
+
+    @field_group("request_data")
+    async def request_data_fields(cls, item: Event, user):
+        roles = await viewer_roles(user)
+        is_attending = roles.attendance(item.id) is not None
+        is_host = bool(user) and roles.hosts(item)
         return {
             "request_data": {
                 "allowed_actions": await EventOut.allowed_actions(item, user, is_host),
-                "user_rate": user_rate.rate if user_rate else None,
+                "user_rate": await user_rate("Event", item.id, user),
                 "is_attending": is_attending,
                 "is_hosting": is_host
-            },
-            "tags": await EventOut.tags(item),
-            "rate": await EventOut.rate(item),
-            "rate_count": item.rate_count,
-            "attendee_count": item.attendee_count,
+            }
         }
 
+    @field_group("tags")
+    async def tag_fields(cls, item: Event, user):
+        return {"tags": await EventOut.tags(item)}
+
+    @field_group("rate")
+    async def rate_fields(cls, item: Event, user):
+        return {"rate": await EventOut.rate(item)}
+
+    @field_group("counts")
+    async def count_fields(cls, item: Event, user):
+        counts = await Event.annotate(
+            attendee_count=Subquery(item.attendees.all().count()),
+            rate_count=Subquery(Rate.filter(item_id=item.id, item_type="Event").count())
+        ).get(id=item.id)
+        return {"rate_count": counts.rate_count, "attendee_count": counts.attendee_count}
+
 
 class AttendeeOut(BaseOutSchema):
     pydantic_model = pydantic_model_creator(Attendee)
 
     @classmethod
-    async def add_fields(cls, item: Attendee, user):
-        if (item.user == user) or (await item.event.is_host(user)):
+    async def prefetch(cls, items: list[Attendee], user):
+        if not cls.wants("form_data"):
+            return
+        await asyncio.gather(loader(Event).load_many({item.event_id for item in items}), viewer_roles(user))
+
+    @field_group("form_data")
+    async def form_data_fields(cls, item: Attendee, user):
+        if user is not None and item.user_id == user.id:
+            return {"form_data": item.form_data}
+        event = await load(Event, item.event_id)
+        if event is not None and (await viewer_roles(user)).hosts(event):
             return {"form_data": item.form_data}
         return {}
 
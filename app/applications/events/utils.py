@@ -1,11 +1,35 @@
 from tortoise.expressions import Subquery, Q
-from datetime import datetime
+from datetime import datetime, timedelta
+from tortoise.functions import Count, Sum
+from fastapi import HTTPException
+from tortoise import Tortoise
 from typing import Optional
+from enum import Enum
+import numpy as np
+import json
+import time
+import pytz
 
-from app.applications.interactions.models import Tag
+from app.core.base.ranking import ranker, column, timestamps, lookup, membership, recency, proximity, saturate
+from app.applications.interactions.models import Tag, Notification, FanOut, Rate
+from app.applications.interactions.utils import rate_aggregates, order_items, Ordering
+from app.applications.organisations.utils import update_club_stats
+from app.applications.users.utils import viewer_profile
+from app.core.scheduler.utils import job, schedule, cancel
+from app.core.auth.utils.jwt import decode_jwt
+from app.core.base.permissions import invalidate_roles
+from app.core.base.context import forget
+from app.core.base.cache import TTLCache
 from app.applications.users.models import Blocked
 from app.core.base.filter_set import FilterSet
 from .models import Event, Attendee
+from app.settings import config
+
+
+class EventOrdering(str, Enum):
+    newest = "newest"
+    trending = "trending"
+    start_date = "start_date"
 
 
 class EventFilter(FilterSet):
@@ -32,6 +56,9 @@ class EventFilter(FilterSet):
         has_club: Optional[int] = None
         tags: Optional[str] = None
         verified_attendees: Optional[int] = None
+        overlaps: Optional[str] = None
+        happening_now: Optional[bool] = None
+        order: Optional[EventOrdering] = None
 
     class Functions(FilterSet.Functions):
         @staticmethod
@@ -51,6 +78,27 @@ class EventFilter(FilterSet):
         def verified_attendees(value: int, queryset, user):
             return queryset.filter(id__in=Subquery(Attendee.filter(user_id=value, is_verified=True).values("event_id"))), []
 
+        @staticmethod
+        def overlaps(value: str, queryset, user):
+            try:
+                starts, ends = (datetime.fromisoformat(bound.strip()) for bound in value.split(","))
+            except ValueError:
+                raise HTTPException(status_code=400, detail="overlaps must be two ISO datetimes: from,to")
+            return queryset.filter(start_date__lte=ends, end_date__gte=starts), []
+
+        @staticmethod
+        def happening_now(value: bool, queryset, user):
+            now = datetime.now(pytz.utc)
+            if value:
+                return queryset.filter(start_date__lte=now, end_date__gte=now), []
+            return queryset.filter(Q(start_date__gt=now) | Q(end_date__lt=now)), []
+
+        @staticmethod
+        def order(value: EventOrdering, queryset, user):
+            if value == EventOrdering.start_date:
+                return queryset.order_by("start_date", "id"), []
+            return order_items(queryset, Ordering(value.value), "Event", "events"), []
+
 
 class AttendeeFilter(FilterSet):
     model = Attendee
@@ -59,3 +107,201 @@ class AttendeeFilter(FilterSet):
     class Parameters(FilterSet.Parameters):
         event: Optional[int] = None
         user: Optional[int] = None
+
+
+verification_tokens = TTLCache(
+    "event_verification_tokens", maxsize=config.EVENT_VERIFICATION_CACHE_SIZE, ttl=config.EVENT_VERIFICATION_CACHE_TTL
+)
+
+TOGGLE_ATTENDANCE_SQL = '''
+WITH "removed" AS (
+    DELETE FROM "attendees" WHERE "event_id" = $1 AND "user_id" = $2 RETURNING "id"
+)
+SELECT count(*) AS "removed" FROM "removed"
+'''
+
+ATTEND_SQL = '''
+INSERT INTO "attendees" ("event_id", "user_id", "is_verified", "form_data") VALUES ($1, $2, false, $3)
+ON CONFLICT ("event_id", "user_id") DO NOTHING
+RETURNING "id"
+'''
+
+VERIFY_SQL = '''
+INSERT INTO "attendees" ("event_id", "user_id", "is_verified") VALUES ($1, $2, true)
+ON CONFLICT ("event_id", "user_id") DO UPDATE SET "is_verified" = true
+RETURNING "id", "event_id", "user_id", "is_verified", "xmax" = 0 AS "inserted"
+'''
+
+TOGGLE_VERIFICATION_SQL = '''
+UPDATE "attendees" SET "is_verified" = NOT "is_verified" WHERE "event_id" = $1 AND "user_id" = $2
+RETURNING "is_verified"
+'''
+
+
+async def verification_event(token: str) -> tuple[int, Optional[int]]:
+    """
+    Event and host club ids of a verification link, decoded and looked up once and then
+    served from memory until the link expires so that check-in bursts skip both steps
+    """
+    event = verification_tokens.get(token)
+    if event is None:
+        payload = decode_jwt(token)
+        host_club_ids = await Event.filter(id=payload["id"]).values_list("host_club_id", flat=True)
+        if not host_club_ids:
+            raise HTTPException(status_code=404, detail="Event not found")
+        event = payload["id"], host_club_ids[0]
+        verification_tokens.set(token, event, ttl=payload["exp"] - time.time())
+    return event
+
+
+async def event_club_stats(event: Event) -> dict:
+    """
+    Returns what the event adds to the statistics of its host club
+    """
+    attendees = await event.attendance.all().count()
+    rates = await Rate.filter(item_id=event.id, item_type="Event").annotate(
+        sum=Sum("rate"), count=Count("id")
+    ).values("sum", "count")
+    return {"events": 1, "attendees": attendees, "rate_sum": rates[0]["sum"] or 0, "rates": rates[0]["count"]}
+
+
+async def toggle_attendance(event: Event, user_id: int, form_data: Optional[dict]) -> bool:
+    """
+    Leaves the event if the user attends it, joins it otherwise. Concurrent calls can not
+    create duplicate rows, the unique (event_id, user_id) index absorbs them.
+    """
+    connection = Tortoise.get_connection("default")
+    forget(("attendance", event.id, user_id))
+    removed = await connection.execute_query_dict(TOGGLE_ATTENDANCE_SQL, [event.id, user_id])
+    invalidate_roles(user_id)
+    if removed[0]["removed"]:
+        await update_club_stats(event.host_club_id, attendees=-removed[0]["removed"])
+        return False
+    if event.form and not form_data:
+        raise HTTPException(status_code=400, detail="Form is needed")
+    inserted = await connection.execute_query_dict(
+        ATTEND_SQL, [event.id, user_id, None if form_data is None else json.dumps(form_data)]
+    )
+    invalidate_roles(user_id)
+    if inserted:
+        await update_club_stats(event.host_club_id, attendees=1)
+    return True
+
+
+async def verify_attendance(event_id: int, host_club_id: Optional[int], user_id: int) -> dict:
+    rows = await Tortoise.get_connection("default").execute_query_dict(VERIFY_SQL, [event_id, user_id])
+    forget(("attendance", event_id, user_id))
+    invalidate_roles(user_id)
+    attendee = rows[0]
+    if attendee.pop("inserted"):
+        await update_club_stats(host_club_id, attendees=1)
+    return attendee
+
+
+async def toggle_verification(event_id: int, user_id: int) -> Optional[bool]:
+    rows = await Tortoise.get_connection("default").execute_query_dict(
+        TOGGLE_VERIFICATION_SQL, [event_id, user_id]
+    )
+    forget(("attendance", event_id, user_id))
+    invalidate_roles(user_id)
+    return rows[0]["is_verified"] if rows else None
+
+
+def start_timestamp(event: Event) -> float:
+    start_date = event.start_date
+    if start_date.tzinfo is None:
+        start_date = start_date.replace(tzinfo=pytz.utc)
+    return start_date.timestamp()
+
+
+async def schedule_event_reminder(event: Event):
+    key = f"event_reminder:{event.id}"
+    start = start_timestamp(event)
+    run_at = datetime.fromtimestamp(start, pytz.utc) - timedelta(minutes=config.EVENT_REMINDER_BEFORE_MINUTES)
+    if run_at <= datetime.now(pytz.utc):
+        await cancel(key)
+        return
+    await schedule("event_reminder", run_at, {"event_id": event.id, "start": start}, key=key)
+
+
+@job("event_reminder")
+async def send_event_reminder(payload: dict):
+    event = await Event.get_or_none(id=payload["event_id"])
+    # a moved event has its own reminder scheduled under the same key
+    if event is None or start_timestamp(event) != payload["start"]:
+        return
+    # a retried reminder continues its unfinished fan-out instead of notifying everyone again
+    fan_out = await FanOut.filter(
+        notification__notif_type=Notification.Type.event_reminder,
+        notification__item_type="Event",
+        notification__item_id=event.id,
+        is_done=False,
+    ).first()
+    if fan_out is not None:
+        await fan_out.run()
+        return
+    await Notification.create_and_fan_out(
+        FanOut.Audience.event_attendees, event.id, Notification.Type.event_reminder, event, wait=True
+    )
+
+
+CALENDAR_SQL = '''
+SELECT "days"."day", count("events"."id") AS "count"
+FROM (
+    SELECT "day"::date AS "day", "day" AT TIME ZONE $3 AS "starts", ("day" + interval '1 day') AT TIME ZONE $3 AS "ends"
+    FROM generate_series($1::timestamp, $2::timestamp, interval '1 day') AS "day"
+) AS "days"
+LEFT JOIN "events" ON tstzrange("events"."start_date", greatest("events"."start_date", "events"."end_date"), '[]')
+    && tstzrange("days"."starts", "days"."ends", '[)'){filters}
+GROUP BY "days"."day"
+ORDER BY "days"."day"
+'''
+
+
+async def month_view(year: int, month: int, timezone: str, category: Optional[int], host_club: Optional[int]):
+    """
+    Number of events going on each day of the month in the given timezone, from one aggregate query
+    """
+    first = datetime(year, month, 1)
+    last = (first + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    params = [first, last, timezone]
+    filters = ""
+    if category is not None:
+        params.append(category)
+        filters += f' AND "events"."category_id" = ${len(params)}'
+    if host_club is not None:
+        params.append(host_club)
+        filters += f' AND "events"."host_club_id" = ${len(params)}'
+    rows = await Tortoise.get_connection("default").execute_query_dict(CALENDAR_SQL.format(filters=filters), params)
+    return [{"day": row["day"], "count": row["count"]} for row in rows]
+
+
+@ranker("Event")
+async def event_features(candidates, user):
+    rows = await candidates.values(
+        "id", "created_at", "start_date", "latitude", "longitude", "category_id", "host_club_id", "host_user_id"
+    )
+    ids = column(rows, "id").astype(np.int64)
+    item_ids = ids.tolist()
+    rates, _ = await rate_aggregates("Event", item_ids)
+    attendee_counts = dict(await Attendee.filter(event_id__in=item_ids).group_by("event_id").annotate(
+        count=Count("id")
+    ).values_list("event_id", "count"))
+    viewer = await viewer_profile(user)
+    hours_to_start = (timestamps(rows, "start_date") - time.time()) / 3600
+    return ids, {
+        "recency": recency(timestamps(rows, "created_at"), config.RANKING_HALF_LIFE_HOURS),
+        "upcoming": np.where(
+            hours_to_start >= 0, np.exp2(-np.abs(hours_to_start) / config.RANKING_HALF_LIFE_HOURS), 0.0
+        ),
+        "rate": lookup(ids, rates),
+        "attendees": saturate(lookup(ids, attendee_counts)),
+        "proximity": proximity(
+            column(rows, "latitude"), column(rows, "longitude"), viewer["latitude"], viewer["longitude"],
+            config.RANKING_DISTANCE_SCALE_KM
+        ),
+        "interest": membership(column(rows, "category_id"), viewer["interests"]),
+        "affinity": membership(column(rows, "host_club_id"), viewer["clubs"])
+        + membership(column(rows, "host_user_id"), viewer["connections"])
+        + membership(ids.astype(np.float64), viewer["events"]),
+    }
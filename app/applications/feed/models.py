@@ -0,0 +1,16 @@
+from tortoise import fields
+
+from app.core.base.models import BaseDBModel
+
+
+class TimelineEntry(BaseDBModel):
+    class Meta:
+        table = "timelines"
+        unique_together = (("user", "post"), )
+
+    user: fields.ForeignKeyRelation = fields.ForeignKeyField(
+        "models.User", related_name="timeline", on_delete=fields.CASCADE
+    )
+    post: fields.ForeignKeyRelation = fields.ForeignKeyField(
+        "models.Post", related_name="timeline_entries", on_delete=fields.CASCADE
+    )
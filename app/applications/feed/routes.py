@@ -0,0 +1,23 @@
+from fastapi import APIRouter, Depends, Query
+from typing import Optional
+
+from app.core.auth.utils.contrib import get_current_active_user
+from app.applications.posts.schemas import PostOut
+from app.applications.users.models import User
+from app.core.base.responses import FastJSONResponse
+from .utils import read_feed
+
+router = APIRouter()
+
+
+@router.get("/", status_code=200, tags=["feed"])
+async def get_feed(
+    before: Optional[int] = Query(None, title="Cursor returned by the previous page"),
+    page_size: int = Query(50, ge=1, le=100, title="Page size"),
+    current_user: User = Depends(get_current_active_user),
+):
+    posts, next_cursor = await read_feed(current_user, before, page_size)
+    return FastJSONResponse({
+        "next_cursor": next_cursor,
+        "results": await PostOut.serialize_page(posts, current_user)
+    })
@@ -0,0 +1,128 @@
+from tortoise.expressions import Q
+from tortoise import Tortoise
+
+from app.applications.users.utils import connection_graph
+from app.applications.posts.utils import PostFilter
+from app.core.scheduler.utils import job
+from app.applications.posts.models import Post
+from app.core.base.cache import TTLCache
+from app.settings import config
+from .models import TimelineEntry
+
+large_sources = TTLCache("feed_large_sources", maxsize=2, ttl=config.FEED_LARGE_SOURCES_TTL_SECONDS)
+
+FAN_OUT_SQL = '''
+INSERT INTO "timelines" ("user_id", "post_id")
+SELECT "audience"."user_id", $1 FROM ({audience}) AS "audience"
+WHERE "audience"."user_id" NOT IN (
+    SELECT "blocking_user_id" FROM "blocked" WHERE "blocked_user_id" = $2
+    UNION ALL SELECT "blocked_user_id" FROM "blocked" WHERE "blocking_user_id" = $2
+)
+ON CONFLICT ("user_id", "post_id") DO NOTHING
+'''
+
+TRIM_SQL = '''
+DELETE FROM "timelines" WHERE "id" IN (
+    SELECT "id" FROM (
+        SELECT "id", row_number() OVER (PARTITION BY "user_id" ORDER BY "post_id" DESC) AS "position"
+        FROM "timelines"
+    ) AS "ranked" WHERE "position" > $1
+)
+'''
+
+
+async def get_large_sources() -> dict[str, set[int]]:
+    """
+    Clubs and events too big to fan out to, their posts are merged into feeds on read
+    """
+    sources = large_sources.get("sources")
+    if sources is None:
+        connection = Tortoise.get_connection("default")
+        clubs = await connection.execute_query_dict(
+            'SELECT "club_id" AS "id" FROM "memberships" GROUP BY "club_id" HAVING count(*) > $1',
+            [config.FEED_FANOUT_MAX_AUDIENCE]
+        )
+        events = await connection.execute_query_dict(
+            'SELECT "event_id" AS "id" FROM "attendees" GROUP BY "event_id" HAVING count(*) > $1',
+            [config.FEED_FANOUT_MAX_AUDIENCE]
+        )
+        sources = {"clubs": {row["id"] for row in clubs}, "events": {row["id"] for row in events}}
+        large_sources.set("sources", sources)
+    return sources
+
+
+def is_large_author(user_id: int) -> bool:
+    return len(connection_graph.connections(user_id)) > config.FEED_FANOUT_MAX_AUDIENCE
+
+
+async def fan_out_post(post: Post):
+    """
+    Writes the post into the timelines of the creator, their connections and the
+    members of its club or attendees of its event, skipping sources that are too big
+    """
+    sources = await get_large_sources()
+    audience = ['SELECT $2::bigint AS "user_id"']
+    if not post.is_anon and not is_large_author(post.creator_id):
+        audience.append(
+            'SELECT "to_user_id" FROM "connections" WHERE "from_user_id" = $2 AND "is_accepted"'
+        )
+        audience.append(
+            'SELECT "from_user_id" FROM "connections" WHERE "to_user_id" = $2 AND "is_accepted"'
+        )
+    params = [post.id, post.creator_id]
+    if post.author_club_id and post.author_club_id not in sources["clubs"]:
+        params.append(post.author_club_id)
+        audience.append(f'SELECT "user_id" FROM "memberships" WHERE "club_id" = ${len(params)}')
+    if post.event_id and post.event_id not in sources["events"]:
+        params.append(post.event_id)
+        audience.append(f'SELECT "user_id" FROM "attendees" WHERE "event_id" = ${len(params)}')
+    await Tortoise.get_connection("default").execute_query(
+        FAN_OUT_SQL.format(audience=" UNION ".join(audience)), params
+    )
+
+
+@job("fan_out_post")
+async def fan_out_post_job(payload: dict):
+    post = await Post.get_or_none(id=payload["post_id"])
+    if post is not None:
+        await fan_out_post(post)
+
+
+async def read_feed(user, before: int | None, limit: int) -> tuple[list[Post], int | None]:
+    """
+    Newest first page of the user's feed, the timeline merged with posts of the
+    large sources the user follows. Returns the posts and the cursor of the next page.
+    """
+    sources = await get_large_sources()
+    clubs = [club_id for club_id in await user.memberships.all().values_list("club_id", flat=True)
+             if club_id in sources["clubs"]]
+    events = [event_id for event_id in await user.attendance.all().values_list("event_id", flat=True)
+              if event_id in sources["events"]]
+    authors = [user_id for user_id in connection_graph.connections(user.id) if is_large_author(user_id)]
+    pulled = []
+    if clubs:
+        pulled.append(Q(author_club_id__in=clubs))
+    if events:
+        pulled.append(Q(event_id__in=events))
+    if authors:
+        pulled.append(Q(creator_id__in=authors, is_anon=False))
+
+    timeline = TimelineEntry.filter(user_id=user.id)
+    if before is not None:
+        timeline = timeline.filter(post_id__lt=before)
+    ids = set(await timeline.order_by("-post_id").limit(limit).values_list("post_id", flat=True))
+    if pulled:
+        queryset = Post.filter(Q(*pulled, join_type="OR"))
+        if before is not None:
+            queryset = queryset.filter(id__lt=before)
+        ids.update(await queryset.order_by("-id").limit(limit).values_list("id", flat=True))
+    ids = sorted(ids, reverse=True)[:limit]
+    posts = await Post.filter(id__in=ids).exclude(
+        PostFilter.hide(user) | PostFilter.block(user)
+    ).order_by("-id")
+    return posts, (ids[-1] if len(ids) == limit else None)
+
+
+@job("trim_timelines")
+async def trim_timelines(payload: dict):
+    await Tortoise.get_connection("default").execute_query(TRIM_SQL, [config.FEED_TIMELINE_SIZE])
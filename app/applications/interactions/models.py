@@ -1,16 +1,32 @@
+from tortoise.transactions import in_transaction
+from datetime import datetime, timedelta
+from tortoise.queryset import QuerySet
+from tortoise.expressions import F, Q
 from tortoise import fields, Model
 from enum import Enum
+import logging
+import asyncio
+import pytz
 
 from app.core.base.models import BaseCreatedAtModel, BaseDBModel, ContentType
-from app.core.fcm.utils import send_notification
+from app.core.base.db import register_schema
+from app.core.auth.utils.cache import invalidate_users
+from app.core.fcm.utils import send_notification, build_message, push
+from app.applications.users.models import User
+from app.core.base.tasks import run_in_background
 from app.core.base.utils import name2model
 from app.core.base.media_manager import S3
+from app.core.fcm.models import FCMDevice
+from app.settings import config
+
+logger = logging.getLogger(__name__)
 
 
 class Notification(BaseDBModel, BaseCreatedAtModel, ContentType):
     class Type(str, Enum):
         connect_accepted = "connect_accept"
         connect_sent = "connect_sent"
+        event_reminder = "event_reminder"
 
     class Meta:
         table = "notifications"
@@ -36,6 +52,8 @@ class Notification(BaseDBModel, BaseCreatedAtModel, ContentType):
                 data["body"] = f"{item.username} isimli kullanıcı bağlantı isteğinizi kabul etti."
             case self.Type.connect_sent:
                 data["body"] = f"{item.username} isimli kullanıcı size bağlantı isteği attı.",
+            case self.Type.event_reminder:
+                data["body"] = f"{item.name} etkinliği yakında başlıyor."
 
         data["image"] = S3.get_file_url(media) if media else None
         return data
@@ -44,21 +62,151 @@ class Notification(BaseDBModel, BaseCreatedAtModel, ContentType):
         my_data = await self.notification_data()
         return await send_notification(self.sent_to.all(), my_data["title"], my_data["body"], my_data["image"])
 
+    async def add_recipients(self, user_ids: list[int], connection):
+        field = self._meta.fields_map["sent_to"]
+        await connection.execute_query(
+            f'INSERT INTO "{field.through}" ("{field.backward_key}", "{field.forward_key}") '
+            'SELECT $1, unnest($2::bigint[]) ON CONFLICT DO NOTHING',
+            [self.id, user_ids]
+        )
+
     @staticmethod
-    async def create_and_sent(
-        sent_to: list,
+    async def create_and_fan_out(
+        audience: "FanOut.Audience",
+        audience_id: int | None,
         notification_type: Type,
         item: Model,
-        is_anon: bool = False
-    ):
+        is_anon: bool = False,
+        user_ids: list[int] | None = None,
+        wait: bool = True,
+    ) -> "FanOut":
         notification = await Notification.create(
             notif_type=notification_type,
             item_id=item.id,
             item_type=item.__class__.__name__,
             is_anon=is_anon
         )
-        await notification.sent_to.add(*sent_to)
-        return await notification.send()
+        fan_out = await FanOut.create(
+            notification=notification,
+            audience=audience,
+            audience_id=audience_id,
+            user_ids=user_ids,
+        )
+        if wait:
+            await fan_out.run()
+        else:
+            run_in_background(fan_out.try_run())
+        return fan_out
+
+    @staticmethod
+    async def create_and_sent(
+        sent_to: list,
+        notification_type: Type,
+        item: Model,
+        is_anon: bool = False
+    ):
+        return await Notification.create_and_fan_out(
+            FanOut.Audience.users, None, notification_type, item, is_anon, [user.id for user in sent_to]
+        )
+
+
+class FanOut(BaseDBModel, BaseCreatedAtModel):
+    class Audience(str, Enum):
+        users = "users"
+        club_members = "club_members"
+        event_attendees = "event_attendees"
+
+    class Meta:
+        table = "fanouts"
+    audience = fields.CharEnumField(enum_type=Audience, max_length=20)
+    audience_id = fields.BigIntField(null=True)
+    user_ids = fields.JSONField(null=True)
+    cursor = fields.BigIntField(default=0)
+    lease_until = fields.DatetimeField(null=True)
+    is_done = fields.BooleanField(default=False, index=True)
+
+    notification: fields.ForeignKeyRelation = fields.ForeignKeyField(
+        "models.Notification", related_name="fan_outs", on_delete=fields.CASCADE
+    )
+
+    def recipients(self) -> QuerySet:
+        match self.audience:
+            case self.Audience.users:
+                queryset = User.filter(id__in=self.user_ids)
+            case self.Audience.club_members:
+                queryset = User.filter(memberships__club_id=self.audience_id)
+            case self.Audience.event_attendees:
+                queryset = User.filter(attendance__event_id=self.audience_id)
+        return queryset.filter(id__gt=self.cursor).order_by("id").distinct()
+
+    async def claim(self) -> bool:
+        now = datetime.now(pytz.utc)
+        return bool(await FanOut.filter(
+            Q(lease_until__isnull=True) | Q(lease_until__lt=now), id=self.id, is_done=False
+        ).update(lease_until=now + timedelta(seconds=config.NOTIFICATION_FANOUT_LEASE_SECONDS)))
+
+    async def run(self):
+        """
+        Streams the audience in id order, every chunk commits its recipients, counters and
+        the cursor together so a restarted worker continues after the last committed chunk.
+        Push of a chunk overlaps with the database work of the next one.
+        """
+        if not await self.claim():
+            return
+        try:
+            await self.deliver()
+        except Exception:
+            # the cursor is committed per chunk, the next resume pass continues from it
+            await FanOut.filter(id=self.id).update(lease_until=None)
+            raise
+
+    async def try_run(self) -> bool:
+        try:
+            await self.run()
+        except Exception:
+            logger.exception("Fan-out %s failed", self.id)
+            return False
+        return True
+
+    async def deliver(self):
+        notification: Notification = await self.notification
+        data = await notification.notification_data()
+        message = build_message(data["title"], data["body"], data["image"])
+        sending = None
+        while True:
+            user_ids = await self.recipients().limit(config.NOTIFICATION_FANOUT_CHUNK_SIZE).values_list("id", flat=True)
+            if not user_ids:
+                break
+            async with in_transaction() as connection:
+                await notification.add_recipients(user_ids, connection)
+                await User.filter(id__in=user_ids).using_db(connection).update(
+                    unread_notifications=F("unread_notifications") + 1
+                )
+                self.cursor = user_ids[-1]
+                self.lease_until = datetime.now(pytz.utc) + timedelta(seconds=config.NOTIFICATION_FANOUT_LEASE_SECONDS)
+                await self.save(using_db=connection, update_fields=["cursor", "lease_until"])
+            # after the commit, otherwise a concurrent read could cache the old counters again
+            invalidate_users(user_ids)
+            registration_ids = await FCMDevice.filter(user_id__in=user_ids).values_list("registration_id", flat=True)
+            if sending is not None:
+                await sending
+            sending = asyncio.create_task(push(message, registration_ids))
+        if sending is not None:
+            await sending
+        self.is_done = True
+        self.lease_until = None
+        await self.save(update_fields=["is_done", "lease_until"])
+
+    @staticmethod
+    async def resume_pending():
+        """
+        Continues fan-outs whose worker died or failed, a running one keeps renewing its lease
+        """
+        now = datetime.now(pytz.utc)
+        for fan_out in await FanOut.filter(
+            Q(lease_until__isnull=True) | Q(lease_until__lt=now), is_done=False
+        ).order_by("id"):
+            await fan_out.try_run()
 
 
 class Report(BaseDBModel, BaseCreatedAtModel, ContentType):
@@ -97,6 +245,51 @@ class Tag(BaseDBModel, ContentType):
     name = fields.CharField(max_length=255)
 
 
+class TagCount(BaseDBModel):
+    class Meta:
+        table = "tag_counts"
+        unique_together = (("item_type", "name"), )
+
+    class PydanticMeta:
+        exclude = ["id"]
+    item_type = fields.CharEnumField(enum_type=ContentType.ModelType)
+    name = fields.CharField(max_length=255)
+    count = fields.IntField(default=0, index=True)
+
+
+class TagDailyCount(BaseDBModel):
+    class Meta:
+        table = "tag_daily_counts"
+        unique_together = (("item_type", "name", "day"), )
+    item_type = fields.CharEnumField(enum_type=ContentType.ModelType)
+    name = fields.CharField(max_length=255)
+    day = fields.DateField(index=True)
+    count = fields.IntField(default=0)
+
+
+register_schema(
+    'CREATE INDEX IF NOT EXISTS "idx_tag_counts_name_prefix" ON "tag_counts" ("name" text_pattern_ops, "count" DESC);'
+)
+
+
+class TrendingScore(BaseDBModel):
+    class Meta:
+        table = "trending_scores"
+        unique_together = (("item_type", "item_id"), )
+    item_type = fields.CharEnumField(enum_type=ContentType.ModelType)
+    item_id = fields.BigIntField()
+    score = fields.FloatField()
+    interactions = fields.IntField(default=0)
+    updated_at = fields.DatetimeField(auto_now=True)
+
+
+register_schema(
+    'CREATE INDEX IF NOT EXISTS "idx_trending_scores_rank" ON "trending_scores" ("item_type", "score" DESC);'
+)
+register_schema('CREATE INDEX IF NOT EXISTS "idx_rates_created_at" ON "rates" ("created_at");')
+register_schema('CREATE INDEX IF NOT EXISTS "idx_comments_created_at" ON "comments" ("created_at");')
+
+
 class Category(BaseDBModel):
     class Meta:
         table = "categories"
@@ -1,11 +1,13 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Header, Query, Response
+from typing import Optional
 
 from app.core.auth.utils.contrib import get_current_active_user, get_current_active_user_optional
-from .schemas import HideCreate, ReportCreate, CategoryOut
+from .utils import TagFilter, categories, category_payload, trending_tags
+from .schemas import HideCreate, ReportCreate, TagCountOut
 from app.applications.users.models import User
+from app.core.base.responses import not_modified
 from app.core.base.paginator import Paginator
-from .models import Category, Hide, Report
-from .utils import TagFilter
+from .models import Hide, Report, Tag
 
 interaction_router = APIRouter()
 
@@ -30,12 +32,19 @@ async def report(
 
 
 @interaction_router.get("/categories/", tags=["interactions"], status_code=200)
-async def get_categories():
-    categories = await CategoryOut.from_queryset(Category.all())
+async def get_categories(
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+):
+    items, version = await categories.get()
+    cached = not_modified(if_none_match, version, response)
+    if cached is not None:
+        return cached
     return {
         "has_next": False,
-        "count": len(categories),
-        "results": categories
+        "count": len(items),
+        "version": version,
+        "results": [category_payload(category) for category in items]
     }
 
 
@@ -45,13 +54,26 @@ async def get_tags(
     current_user: User = Depends(get_current_active_user_optional),
     tags=Depends(TagFilter.dependency())
 ):
-    tags = tags[0].all().distinct().limit(
-        paginator.page_size
-    ).offset(
-        (paginator.page - 1) * paginator.page_size
-    ).values("name")
+    """
+    Tags ordered by usage, filter with name__startswith for autocomplete
+    """
+    queryset, annotations = tags
+    return await paginator((queryset.filter(count__gt=0).order_by("-count", "name"), annotations), TagCountOut, current_user)
+
+
+@interaction_router.get("/tags/trending/", tags=["interactions"], status_code=200)
+async def get_trending_tags(
+    paginator: Paginator = Depends(),
+    days: int = Query(7, ge=1, le=90),
+    item_type: Optional[Tag.ModelType] = None,
+    name__startswith: Optional[str] = None,
+):
+    offset = (paginator.page - 1) * paginator.page_size
+    count, results = await trending_tags(
+        days, item_type.value if item_type else None, name__startswith, paginator.page_size, offset
+    )
     return {
-        "has_next": True,
-        "count": 9999999,
-        "results": await tags
+        "has_next": offset + paginator.page_size < count,
+        "count": count,
+        "results": results
     }
@@ -1,15 +1,15 @@
 from tortoise.contrib.pydantic import pydantic_model_creator
 from pydantic import BaseModel, Field
 
-from .models import Notification, Hide, Report, Category
-from app.core.base.schemas import BaseOutSchema
+from .models import Notification, Hide, Report, Category, TagCount
+from app.core.base.schemas import BaseOutSchema, field_group
 
 
 class NotificationOut(BaseOutSchema):
     pydantic_model = pydantic_model_creator(Notification)
 
-    @classmethod
-    async def add_fields(cls, item: Notification, user):
+    @field_group("notification_data")
+    async def notification_fields(cls, item: Notification, user):
         return {
             "notification_data": await item.notification_data()
         }
@@ -23,6 +23,10 @@ class ReportOut(BaseOutSchema):
     pydantic_model = pydantic_model_creator(Report)
 
 
+class TagCountOut(BaseOutSchema):
+    pydantic_model = pydantic_model_creator(TagCount)
+
+
 CategoryOut = pydantic_model_creator(Category)
 
 
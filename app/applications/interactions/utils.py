@@ -1,7 +1,18 @@
+from tortoise.expressions import Q, Subquery, RawSQL
+from tortoise.functions import Avg, Count
+from datetime import date, datetime, timedelta
+from tortoise.queryset import QuerySet
+from tortoise import Tortoise
 from typing import Optional
+from enum import Enum
+import pytz
 
+from .models import Hide, Report, Tag, TagCount, Category, FanOut, Rate, TrendingScore
+from app.core.base.reference import ReferenceData
+from app.core.scheduler.utils import job
+from app.core.base.media_manager import S3
 from app.core.base.filter_set import FilterSet
-from .models import Hide, Report, Tag
+from app.settings import config
 
 
 class HideFilter(FilterSet):
@@ -20,8 +31,204 @@ class ReportFilter(FilterSet):
 
 
 class TagFilter(FilterSet):
-    model = Tag
+    model = TagCount
     search_fields = ["name"]
 
+    @classmethod
+    def hide(cls, user):
+        return Q(name__in=Subquery(
+            Tag.filter(id__in=Subquery(user.hides.filter(item_type="Tag").values("item_id"))).values("name")
+        ))
+
     class Parameters(FilterSet.Parameters):
         item_type: Optional[Tag.ModelType] = None
+        name__startswith: Optional[str] = None
+
+
+async def count_tags(item_type: str, names: list[str], delta: int):
+    if not names:
+        return
+    connection = Tortoise.get_connection("default")
+    await connection.execute_query(
+        'INSERT INTO "tag_counts" ("item_type", "name", "count") SELECT $1, unnest($2::text[]), $3 '
+        'ON CONFLICT ("item_type", "name") DO UPDATE SET "count" = "tag_counts"."count" + EXCLUDED."count"',
+        [item_type, names, delta]
+    )
+    if delta > 0:
+        await connection.execute_query(
+            'INSERT INTO "tag_daily_counts" ("item_type", "name", "day", "count") '
+            'SELECT $1, unnest($2::text[]), CURRENT_DATE, $3 '
+            'ON CONFLICT ("item_type", "name", "day") DO UPDATE '
+            'SET "count" = "tag_daily_counts"."count" + EXCLUDED."count"',
+            [item_type, names, delta]
+        )
+
+
+async def add_tags(item_type: str, item_id: int, names: list[str]):
+    names = list(dict.fromkeys(names))
+    await Tag.bulk_create(
+        Tag(name=name, item_id=item_id, item_type=item_type) for name in names
+    )
+    await count_tags(item_type, names, 1)
+
+
+async def set_tags(item_type: str, item_id: int, names: list[str]):
+    existing = set(await Tag.filter(item_type=item_type, item_id=item_id).values_list("name", flat=True))
+    removed = [name for name in existing if name not in names]
+    if removed:
+        await Tag.filter(item_type=item_type, item_id=item_id, name__in=removed).delete()
+        await count_tags(item_type, removed, -1)
+    await add_tags(item_type, item_id, [name for name in names if name not in existing])
+
+
+async def rebuild_tag_counts():
+    await Tortoise.get_connection("default").execute_script(
+        'INSERT INTO "tag_counts" ("item_type", "name", "count") '
+        'SELECT "item_type", "name", count(*) FROM "tags" GROUP BY "item_type", "name" '
+        'ON CONFLICT ("item_type", "name") DO UPDATE SET "count" = EXCLUDED."count";'
+    )
+
+
+async def rate_aggregates(item_type: str, item_ids: list[int]) -> tuple[dict[int, float], dict[int, int]]:
+    rows = await Rate.filter(item_type=item_type, item_id__in=item_ids).group_by("item_id").annotate(
+        avg=Avg("rate"), count=Count("id")
+    ).values("item_id", "avg", "count")
+    return {row["item_id"]: row["avg"] for row in rows}, {row["item_id"]: row["count"] for row in rows}
+
+
+async def user_rate(item_type: str, item_id: int, user) -> Optional[float]:
+    if user is None:
+        return None
+    rates = await Rate.filter(item_type=item_type, item_id=item_id, rater_id=user.id).values_list("rate", flat=True)
+    return rates[0] if rates else None
+
+
+async def load_categories() -> list[dict]:
+    return await Category.all().order_by("id").values("id", "name", "picture_name")
+
+
+def category_payload(category: dict) -> dict:
+    picture_name = category["picture_name"]
+    return {**category, "picture": S3.get_file_url(picture_name) if picture_name else None}
+
+
+categories = ReferenceData(load_categories, config.REFERENCE_DATA_TTL_SECONDS)
+
+
+async def trending_tags(days: int, item_type: Optional[str], prefix: Optional[str], limit: int, offset: int):
+    conditions = ['"day" >= $1']
+    params = [date.today() - timedelta(days=days - 1)]
+    if item_type:
+        params.append(item_type)
+        conditions.append(f'"item_type" = ${len(params)}')
+    if prefix:
+        params.append(prefix.replace("%", r"\%").replace("_", r"\_") + "%")
+        conditions.append(f'"name" LIKE ${len(params)}')
+    where = " AND ".join(conditions)
+    connection = Tortoise.get_connection("default")
+    count = await connection.execute_query_dict(
+        f'SELECT count(*) AS "count" FROM (SELECT 1 FROM "tag_daily_counts" WHERE {where} '
+        'GROUP BY "item_type", "name") AS "trending"',
+        params
+    )
+    results = await connection.execute_query_dict(
+        f'SELECT "item_type", "name", sum("count") AS "uses" FROM "tag_daily_counts" WHERE {where} '
+        f'GROUP BY "item_type", "name" ORDER BY "uses" DESC, "name" LIMIT {int(limit)} OFFSET {int(offset)}',
+        params
+    )
+    return count[0]["count"], results
+
+
+class Ordering(str, Enum):
+    newest = "newest"
+    trending = "trending"
+
+
+def order_items(queryset: QuerySet, ordering: Ordering, item_type: str, table: str) -> QuerySet:
+    if ordering == Ordering.trending:
+        return queryset.annotate(trending=RawSQL(
+            f'COALESCE((SELECT "score" FROM "trending_scores" WHERE "item_type" = \'{item_type}\' '
+            f'AND "item_id" = "{table}"."id"), 0)'
+        )).order_by("-trending", "-id")
+    return queryset.order_by("-id")
+
+
+# scores are ln(engagement) plus the creation time divided by the decay period, an item needs
+# e times the engagement of one created a decay period later to rank as high. They never go stale
+# with time, only items with new interactions have to be rescored. The weights are cast, next to
+# count(*) postgres would infer them as bigint and fractional weights would be truncated.
+TRENDING_POSTS_SQL = '''
+INSERT INTO "trending_scores" ("item_type", "item_id", "score", "interactions", "updated_at")
+SELECT 'Post', "posts"."id",
+    ln(1 + $2::float8 * "counts"."rates" + $3::float8 * "counts"."comments")
+        + extract(epoch FROM "posts"."created_at") / $4,
+    "counts"."rates" + "counts"."comments", now()
+FROM "posts", LATERAL (
+    SELECT
+        (SELECT count(*) FROM "rates" WHERE "item_type" = 'Post' AND "item_id" = "posts"."id") AS "rates",
+        (SELECT count(*) FROM "comments" WHERE "post_id" = "posts"."id") AS "comments"
+) AS "counts"
+WHERE "posts"."created_at" >= now() - $5 * interval '1 hour' AND (
+    "posts"."created_at" > $1
+    OR "posts"."id" IN (SELECT "item_id" FROM "rates" WHERE "item_type" = 'Post' AND "created_at" > $1)
+    OR "posts"."id" IN (SELECT "post_id" FROM "comments" WHERE "created_at" > $1)
+)
+ON CONFLICT ("item_type", "item_id") DO UPDATE
+SET "score" = EXCLUDED."score", "interactions" = EXCLUDED."interactions", "updated_at" = EXCLUDED."updated_at"
+WHERE "trending_scores"."interactions" IS DISTINCT FROM EXCLUDED."interactions"
+'''
+
+# attendees carry no timestamp, so every recent event is recounted and only changed rows are written
+TRENDING_EVENTS_SQL = '''
+INSERT INTO "trending_scores" ("item_type", "item_id", "score", "interactions", "updated_at")
+SELECT 'Event', "events"."id",
+    ln(1 + $1::float8 * "counts"."attendees" + $2::float8 * "counts"."rates")
+        + extract(epoch FROM "events"."created_at") / $3,
+    "counts"."attendees" + "counts"."rates", now()
+FROM "events", LATERAL (
+    SELECT
+        (SELECT count(*) FROM "attendees" WHERE "event_id" = "events"."id") AS "attendees",
+        (SELECT count(*) FROM "rates" WHERE "item_type" = 'Event' AND "item_id" = "events"."id") AS "rates"
+) AS "counts"
+WHERE "events"."created_at" >= now() - $4 * interval '1 hour' OR "events"."end_date" >= now()
+ON CONFLICT ("item_type", "item_id") DO UPDATE
+SET "score" = EXCLUDED."score", "interactions" = EXCLUDED."interactions", "updated_at" = EXCLUDED."updated_at"
+WHERE "trending_scores"."interactions" IS DISTINCT FROM EXCLUDED."interactions"
+'''
+
+TRENDING_PRUNE_SQL = '''
+DELETE FROM "trending_scores" WHERE "updated_at" < $1 AND NOT (
+    "item_type" = 'Event' AND "item_id" IN (SELECT "id" FROM "events" WHERE "end_date" >= now())
+)
+'''
+
+
+@job("update_trending_scores")
+async def update_trending_scores(payload: dict):
+    window = datetime.now(pytz.utc) - timedelta(hours=config.TRENDING_WINDOW_HOURS)
+    last_update = await TrendingScore.filter(item_type="Post").order_by("-updated_at").first().values_list(
+        "updated_at", flat=True
+    )
+    # rows committed while the previous run was going on are picked up by the overlap
+    since = window if last_update is None else max(window, last_update - timedelta(minutes=5))
+    decay_seconds = config.TRENDING_DECAY_HOURS * 3600
+    connection = Tortoise.get_connection("default")
+    await connection.execute_query(TRENDING_POSTS_SQL, [
+        since, config.TRENDING_RATE_WEIGHT, config.TRENDING_COMMENT_WEIGHT, decay_seconds, config.TRENDING_WINDOW_HOURS
+    ])
+    await connection.execute_query(TRENDING_EVENTS_SQL, [
+        config.TRENDING_ATTENDEE_WEIGHT, config.TRENDING_RATE_WEIGHT, decay_seconds, config.TRENDING_WINDOW_HOURS
+    ])
+    await connection.execute_query(TRENDING_PRUNE_SQL, [window])
+
+
+@job("resume_fanouts")
+async def resume_fanouts(payload: dict):
+    await FanOut.resume_pending()
+
+
+@job("cleanup_fanouts")
+async def cleanup_fanouts(payload: dict):
+    await FanOut.filter(
+        is_done=True, created_at__lt=datetime.now(pytz.utc) - timedelta(days=config.SCHEDULER_KEEP_DONE_DAYS)
+    ).delete()
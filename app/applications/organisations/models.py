@@ -1,6 +1,8 @@
+from typing import Optional
 from tortoise import fields
 
 from app.core.base.models import BaseCreatedUpdatedAtModel, LocationModel, BaseDBModel, MediaModel
+from app.core.base.context import memoize
 
 
 class Organisation(BaseDBModel, BaseCreatedUpdatedAtModel, LocationModel, MediaModel):
@@ -50,13 +52,23 @@ class Club(Organisation):
         "models.User", related_name="clubs", backward_key="club_id", through="memberships"
     )
 
+    async def membership(self, user) -> Optional[bool]:
+        """
+        is_admin flag of the user's membership, None if the user is not a member
+        """
+        if user is None:
+            return None
+        return await memoize(
+            ("membership", self.id, user.id),
+            lambda: Membership.filter(club_id=self.id, user_id=user.id).first().values_list("is_admin", flat=True)
+        )
+
     async def membership_status(self, user):
-        membership: Membership = await Membership.get_or_none(club=self, user=user)
-        return -1 if membership is None else int(membership.is_admin)
+        is_admin = await self.membership(user)
+        return -1 if is_admin is None else int(is_admin)
 
     async def is_admin(self, user):
-        membership: Membership = await Membership.get_or_none(club=self, user=user)
-        return False if membership is None else membership.is_admin
+        return bool(await self.membership(user))
 
     async def can_post(self, user):
         if self.post_policy:
@@ -68,6 +80,24 @@ class Club(Organisation):
             await self.delete()
 
 
+class ClubStats(BaseDBModel):
+    class Meta:
+        table = "club_stats"
+    event_count = fields.IntField(default=0)
+    attendee_count = fields.IntField(default=0)
+    rate_sum = fields.FloatField(default=0)
+    rate_count = fields.IntField(default=0)
+    updated_at = fields.DatetimeField(auto_now=True)
+
+    club: fields.OneToOneRelation = fields.OneToOneField(
+        "models.Club", related_name="stats", on_delete=fields.CASCADE
+    )
+
+    @property
+    def rate(self):
+        return self.rate_sum / self.rate_count if self.rate_count else None
+
+
 class Place(Organisation):
     class Meta:
         table = "places"
@@ -86,7 +116,9 @@ class Place(Organisation):
     )
 
     async def is_owner(self, user):
-        return await self.owners.filter(id=user.id).exists()
+        if user is None:
+            return False
+        return await memoize(("ownership", self.id, user.id), lambda: self.owners.filter(id=user.id).exists())
 
     async def destroy_non_owner(self):
         if not await self.owners.all().exists():
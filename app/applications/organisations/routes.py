@@ -1,14 +1,16 @@
 from fastapi import APIRouter, Depends
-from tortoise.expressions import Q
 
 from .schemas import ClubOut, PlaceOut, ClubCreate, ClubUpdate, PlaceCreate, PlaceUpdate, AdvertisementCreate, AdvertisementOut
 from app.core.auth.utils.contrib import get_current_active_user, get_current_active_user_optional
 from app.core.base.utils import get_object_or_404, has_permission
+from app.applications.interactions.utils import add_tags, set_tags
 from .models import Club, Place, Membership, Advertisement
-from app.applications.interactions.models import Tag
+from app.applications.users.utils import connection_graph
 from app.applications.users.models import User
 from app.core.base.paginator import Paginator
 from app.core.base.extractor import Extractor
+from app.core.base.permissions import invalidate_roles
+from app.core.base.context import forget
 from .utils import ClubFilter, PlaceFilter
 
 
@@ -45,10 +47,10 @@ async def create_club(
 
     club = await Club.create(**club_dict)
     await Membership.create(club=club, user=current_user, is_admin=True)
+    invalidate_roles(current_user.id)
+    connection_graph.join_club(current_user.id, club.id)
 
-    await Tag.bulk_create(
-        Tag(name=name, item_id=club.id, item_type="Club") for name in data.tags
-    )
+    await add_tags("Club", club.id, data.tags)
     return {"created": await ClubOut.serialize(club, current_user), "media_upload": urls}
 
 
@@ -69,9 +71,7 @@ async def update_club(
     await club.update_from_dict(club_dict).save()
 
     if data.tags is not None:
-        await Tag.filter(Q(item_id=id, item_type="Club") & ~Q(name__in=data.tags)).delete()
-        for tag in data.tags:
-            await Tag.get_or_create(name=tag, item_id=id, item_type="Club")
+        await set_tags("Club", id, data.tags)
     return {"updated": await ClubOut.serialize(club, current_user), "media_upload": urls}
 
 
@@ -81,11 +81,16 @@ async def join(
     current_user: User = Depends(get_current_active_user),
 ):
     club: Club = await get_object_or_404(Club, id=id)
+    forget(("membership", club.id, current_user.id))
     if await club.members.filter(id=current_user.id).exists():
         await club.members.remove(current_user)
+        invalidate_roles(current_user.id)
+        connection_graph.leave_club(current_user.id, club.id)
         await club.destroy_non_admin()
         return False
     await club.members.add(current_user)
+    invalidate_roles(current_user.id)
+    connection_graph.join_club(current_user.id, club.id)
     return True
 
 
@@ -102,6 +107,8 @@ async def add_admin(
 
     membership.is_admin = not membership.is_admin
     await membership.save()
+    forget(("membership", club.id, user_id))
+    invalidate_roles(user_id)
 
     if not membership.is_admin:
         await club.destroy_non_admin()
@@ -142,10 +149,9 @@ async def create_place(
 
     place = await Place.create(**place_dict)
     await place.owners.add(current_user)
+    invalidate_roles(current_user.id)
 
-    await Tag.bulk_create(
-        Tag(name=name, item_id=place.id, item_type="Place") for name in data.tags
-    )
+    await add_tags("Place", place.id, data.tags)
     return {"created": await PlaceOut.serialize(place, current_user), "media_upload": urls}
 
 
@@ -166,9 +172,7 @@ async def update_place(
     await place.update_from_dict(place_dict).save()
 
     if data.tags is not None:
-        await Tag.filter(Q(item_id=id, item_type="Place") & ~Q(name__in=data.tags)).delete()
-        for tag in data.tags:
-            await Tag.get_or_create(name=tag, item_id=id, item_type="Place")
+        await set_tags("Place", id, data.tags)
     return {"updated": await PlaceOut.serialize(place, current_user), "media_upload": urls}
 
 
@@ -179,14 +183,17 @@ async def add_place_owner(
     current_user: User = Depends(get_current_active_user),
 ):
     place: Place = await get_object_or_404(Place, id=id)
-    has_permission(place.is_owner, current_user)
+    await has_permission(place.is_owner, current_user)
     user: User = await get_object_or_404(User, id=user_id)
 
+    forget(("ownership", place.id, user.id))
     if await place.owners.filter(id=user.id).exists():
         await place.owners.remove(user)
+        invalidate_roles(user.id)
         await place.destroy_non_owner()
         return False
     await place.owners.add(user)
+    invalidate_roles(user.id)
     return True
 
 
@@ -197,6 +204,8 @@ async def leave_place(
 ):
     place: Place = await get_object_or_404(Place, id=id)
     await place.owners.remove(current_user)
+    forget(("ownership", place.id, current_user.id))
+    invalidate_roles(current_user.id)
     await place.destroy_non_owner()
     return {"message": "successfully removed"}
 
@@ -218,7 +227,7 @@ async def add_place_ad(
     current_user: User = Depends(get_current_active_user),
 ):
     place: Place = await get_object_or_404(Place, id=id)
-    has_permission(place.is_owner, current_user)
+    await has_permission(place.is_owner, current_user)
 
     extractor = Extractor(data)
     urls, media_dict = extractor.media_files()
@@ -1,25 +1,17 @@
 from tortoise.contrib.pydantic import pydantic_model_creator
 from tortoise.expressions import Subquery
 from pydantic import BaseModel, Field
-from tortoise.functions import Avg
 from typing import Optional
 
-from app.applications.interactions.models import Tag, Rate
-from app.applications.events.models import Attendee
-from app.core.base.schemas import BaseOutSchema
-from .models import Club, Place, Advertisement
+from app.applications.interactions.models import Tag
+from app.core.base.schemas import BaseOutSchema, field_group
+from app.core.base.permissions import viewer_roles
+from .models import Club, Place, Advertisement, ClubStats
 
 
 class ClubOut(BaseOutSchema):
     pydantic_model = pydantic_model_creator(Club)
 
-    @staticmethod
-    async def rate(item: Club):
-        event_ids = [event.id for event in item.hosted_events]
-        return (await Rate.filter(
-            item_id__in=event_ids, item_type="Club"
-        ).annotate(avg=Avg("rate")).values("avg"))[0]["avg"]
-
     @staticmethod
     async def tags(item: Club):
         return await Tag.filter(
@@ -29,12 +21,12 @@ class ClubOut(BaseOutSchema):
 
     @classmethod
     async def allowed_actions(cls, item: Club, user):
-        is_admin = await item.is_admin(user)
+        is_admin = (await viewer_roles(user)).is_admin(item.id)
         return {
             "can_hide": user is not None,
             "can_update": user is not None and is_admin,
             "can_delete": False,
-            "can_post": user is not None and await item.can_post(user),
+            "can_post": user is not None and (item.post_policy or is_admin),
             "can_event": user is not None and is_admin,
             "can_moderate": user is not None and is_admin,
             "can_report": user is not None,
@@ -42,23 +34,51 @@ class ClubOut(BaseOutSchema):
         }
 
     @classmethod
-    async def add_fields(cls, item: Club, user):
-        item = await Club.annotate(
-            post_count=Subquery(item.posts.all().count()),
-            event_attendee_count=Subquery(Attendee.filter(event__host_club=item).count()),
-            member_count=Subquery(item.members.all().count()),
-        ).prefetch_related("hosted_events").get(id=item.id)
+    async def prefetch(cls, items: list[Club], user):
+        if cls.wants("request_data"):
+            await viewer_roles(user)
+        if not (cls.wants("rate") or cls.wants("counts")):
+            return
+        stats = {stat.club_id: stat for stat in await ClubStats.filter(club_id__in=[item.id for item in items])}
+        for item in items:
+            item.club_stats = stats.get(item.id, ClubStats(club_id=item.id))
+
+    @staticmethod
+    async def stats(item: Club) -> ClubStats:
+        stats = getattr(item, "club_stats", None)
+        if stats is None:
+            stats = await ClubStats.get_or_none(club_id=item.id) or ClubStats(club_id=item.id)
+        return stats
+
+    @field_group("request_data")
+    async def request_data_fields(cls, item: Club, user):
         return {
             "request_data": {
                 "allowed_actions": await ClubOut.allowed_actions(item, user),
-                "is_joined": user is not None and await item.members.filter(id=user.id).exists()
-            },
-            "tags": await ClubOut.tags(item),
-            "rate": await ClubOut.rate(item),
-            "post_count": item.post_count,
-            "event_count": len(item.hosted_events),
-            "member_count": item.member_count,
-            "event_attendee_count": item.event_attendee_count,
+                "is_joined": (await viewer_roles(user)).membership(item.id) is not None
+            }
+        }
+
+    @field_group("tags")
+    async def tag_fields(cls, item: Club, user):
+        return {"tags": await ClubOut.tags(item)}
+
+    @field_group("rate")
+    async def rate_fields(cls, item: Club, user):
+        return {"rate": (await ClubOut.stats(item)).rate}
+
+    @field_group("counts")
+    async def count_fields(cls, item: Club, user):
+        stats = await ClubOut.stats(item)
+        counts = await Club.annotate(
+            post_count=Subquery(item.posts.all().count()),
+            member_count=Subquery(item.members.all().count()),
+        ).get(id=item.id)
+        return {
+            "post_count": counts.post_count,
+            "event_count": stats.event_count,
+            "member_count": counts.member_count,
+            "event_attendee_count": stats.attendee_count,
         }
 
 
@@ -72,9 +92,14 @@ class PlaceOut(BaseOutSchema):
             item_id=item.id
         ).values_list("name", flat=True)
 
+    @classmethod
+    async def prefetch(cls, items: list[Place], user):
+        if cls.wants("request_data"):
+            await viewer_roles(user)
+
     @classmethod
     async def allowed_actions(cls, item: Place, user):
-        is_owner = await item.is_owner(user)
+        is_owner = (await viewer_roles(user)).owns(item.id)
         return {
             "can_hide": user is not None,
             "can_update": user is not None and is_owner,
@@ -83,21 +108,26 @@ class PlaceOut(BaseOutSchema):
             "can_report": user is not None,
         }
 
-    @classmethod
-    async def add_fields(cls, item: Place, user):
-        item = await Place.annotate(
-            owner_count=Subquery(item.owners.all().count()),
-            advertisement_count=Subquery(item.advertisements.all().count())
-        ).get(id=item.id)
+    @field_group("request_data")
+    async def request_data_fields(cls, item: Place, user):
         return {
             "requets_data": {
                 "allowed_actions": await PlaceOut.allowed_actions(item, user),
-            },
-            "owner_count": item.owner_count,
-            "advertisement_count": item.advertisement_count,
-            "tags": await PlaceOut.tags(item)
+            }
         }
 
+    @field_group("counts")
+    async def count_fields(cls, item: Place, user):
+        counts = await Place.annotate(
+            owner_count=Subquery(item.owners.all().count()),
+            advertisement_count=Subquery(item.advertisements.all().count())
+        ).get(id=item.id)
+        return {"owner_count": counts.owner_count, "advertisement_count": counts.advertisement_count}
+
+    @field_group("tags")
+    async def tag_fields(cls, item: Place, user):
+        return {"tags": await PlaceOut.tags(item)}
+
 
 class AdvertisementOut(BaseOutSchema):
     pydantic_model = pydantic_model_creator(Advertisement)
@@ -1,8 +1,17 @@
 from tortoise.expressions import Subquery, Q
+from tortoise.functions import Count
+from tortoise import Tortoise
 from typing import Optional
+import numpy as np
 
+from app.core.base.ranking import ranker, column, timestamps, lookup, membership, recency, proximity, saturate
+from app.applications.users.utils import viewer_profile, connection_graph
+from app.applications.interactions.utils import rate_aggregates
 from app.applications.interactions.models import Tag
+from app.applications.events.models import Event
 from app.core.base.filter_set import FilterSet
+from app.core.scheduler.utils import job
+from app.settings import config
 from .models import Club, Place, Membership
 
 
@@ -70,3 +79,95 @@ class PlaceFilter(FilterSet):
             return queryset.filter(
                 id__in=Subquery(Tag.filter(item_type="Place", name__in=tags).values("item_id"))
             ), []
+
+
+@ranker("Club")
+async def club_features(candidates, user):
+    rows = await candidates.values("id", "created_at", "latitude", "longitude", "category_id")
+    ids = column(rows, "id").astype(np.int64)
+    item_ids = ids.tolist()
+    events = await Event.filter(host_club_id__in=item_ids).values_list("id", "host_club_id")
+    event_rates, _ = await rate_aggregates("Event", [event_id for event_id, _ in events])
+    club_rates = {}
+    for event_id, club_id in events:
+        if event_id in event_rates:
+            club_rates.setdefault(club_id, []).append(event_rates[event_id])
+    member_counts = dict(await Membership.filter(club_id__in=item_ids).group_by("club_id").annotate(
+        count=Count("id")
+    ).values_list("club_id", "count"))
+    viewer = await viewer_profile(user)
+    connections = viewer["connections"]
+    known_members = {
+        club_id: len(connections.intersection(connection_graph.club_members.get(club_id, ())))
+        for club_id in item_ids
+    } if connections else {}
+    return ids, {
+        "recency": recency(timestamps(rows, "created_at"), config.RANKING_HALF_LIFE_HOURS),
+        "rate": lookup(ids, {club_id: sum(rates) / len(rates) for club_id, rates in club_rates.items()}),
+        "members": saturate(lookup(ids, member_counts)),
+        "proximity": proximity(
+            column(rows, "latitude"), column(rows, "longitude"), viewer["latitude"], viewer["longitude"],
+            config.RANKING_DISTANCE_SCALE_KM
+        ),
+        "interest": membership(column(rows, "category_id"), viewer["interests"]),
+        "affinity": saturate(lookup(ids, known_members)),
+    }
+
+
+CLUB_STATS_SQL = '''
+INSERT INTO "club_stats" ("club_id", "event_count", "attendee_count", "rate_sum", "rate_count", "updated_at")
+VALUES ($1, $2, $3, $4, $5, now())
+ON CONFLICT ("club_id") DO UPDATE SET
+    "event_count" = "club_stats"."event_count" + EXCLUDED."event_count",
+    "attendee_count" = "club_stats"."attendee_count" + EXCLUDED."attendee_count",
+    "rate_sum" = "club_stats"."rate_sum" + EXCLUDED."rate_sum",
+    "rate_count" = "club_stats"."rate_count" + EXCLUDED."rate_count",
+    "updated_at" = EXCLUDED."updated_at"
+'''
+
+REBUILD_CLUB_STATS_SQL = '''
+INSERT INTO "club_stats" ("club_id", "event_count", "attendee_count", "rate_sum", "rate_count", "updated_at")
+SELECT "clubs"."id", coalesce("events"."count", 0), coalesce("attendees"."count", 0),
+    coalesce("rates"."sum", 0), coalesce("rates"."count", 0), now()
+FROM "clubs"
+LEFT JOIN (
+    SELECT "host_club_id", count(*) AS "count" FROM "events" GROUP BY "host_club_id"
+) AS "events" ON "events"."host_club_id" = "clubs"."id"
+LEFT JOIN (
+    SELECT "events"."host_club_id", count(*) AS "count" FROM "attendees"
+    JOIN "events" ON "events"."id" = "attendees"."event_id" GROUP BY "events"."host_club_id"
+) AS "attendees" ON "attendees"."host_club_id" = "clubs"."id"
+LEFT JOIN (
+    SELECT "events"."host_club_id", sum("rates"."rate") AS "sum", count(*) AS "count" FROM "rates"
+    JOIN "events" ON "events"."id" = "rates"."item_id" AND "rates"."item_type" = 'Event'
+    GROUP BY "events"."host_club_id"
+) AS "rates" ON "rates"."host_club_id" = "clubs"."id"
+ON CONFLICT ("club_id") DO UPDATE SET
+    "event_count" = EXCLUDED."event_count",
+    "attendee_count" = EXCLUDED."attendee_count",
+    "rate_sum" = EXCLUDED."rate_sum",
+    "rate_count" = EXCLUDED."rate_count",
+    "updated_at" = EXCLUDED."updated_at"
+'''
+
+
+async def update_club_stats(
+    club_id: Optional[int], events: int = 0, attendees: int = 0, rate_sum: float = 0, rates: int = 0
+):
+    """
+    Applies deltas to the statistics row of a club, events of no club are ignored
+    """
+    if club_id is None:
+        return
+    await Tortoise.get_connection("default").execute_query(
+        CLUB_STATS_SQL, [club_id, events, attendees, rate_sum, rates]
+    )
+
+
+async def rebuild_club_stats():
+    await Tortoise.get_connection("default").execute_query(REBUILD_CLUB_STATS_SQL)
+
+
+@job("rebuild_club_stats")
+async def rebuild_club_stats_job(payload: dict):
+    await rebuild_club_stats()
@@ -1,6 +1,9 @@
 from tortoise import fields
 
 from app.core.base.models import BaseCreatedUpdatedAtModel, LocationModel, BaseDBModel, MediaModel
+from app.applications.organisations.models import Club
+from app.core.base.db import register_schema
+from app.core.base.context import load
 
 
 class Post(BaseDBModel, BaseCreatedUpdatedAtModel, LocationModel, MediaModel):
@@ -29,9 +32,13 @@ class Post(BaseDBModel, BaseCreatedUpdatedAtModel, LocationModel, MediaModel):
     )
 
     async def is_creator(self, user):
-        if self.author_club:
-            return (self.creator == user and self.author_club.post_policy) or await self.author_club.is_admin(user)
-        return self.creator == user
+        if user is None:
+            return False
+        is_creator = self.creator_id == user.id
+        if self.author_club_id:
+            author_club = await load(Club, self.author_club_id)
+            return (is_creator and author_club.post_policy) or await author_club.is_admin(user)
+        return is_creator
 
 
 class Comment(BaseDBModel, BaseCreatedUpdatedAtModel):
@@ -57,4 +64,10 @@ class Comment(BaseDBModel, BaseCreatedUpdatedAtModel):
     )
 
     async def is_creator(self, user):
-        return self.creator == user
+        return user is not None and self.creator_id == user.id
+
+
+# thread loading walks replies level by level in creation order
+register_schema(
+    'CREATE INDEX IF NOT EXISTS "idx_comments_post_reply_created" ON "comments" ("post_id", "reply_to_id", "created_at");'
+)
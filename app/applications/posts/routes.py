@@ -1,17 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException
-from tortoise.expressions import Q
+from fastapi import APIRouter, Depends, HTTPException, Query
+from datetime import datetime
+import pytz
 
 from app.core.auth.utils.contrib import get_current_active_user, get_current_active_user_optional
 from .schemas import PostOut, PostCreate, PostUpdate, CommentOut, CommentCreate, CommentUpdate
 from app.core.base.utils import get_object_or_404, has_permission
+from app.applications.interactions.utils import add_tags, set_tags
 from app.applications.interactions.schemas import RateItem
-from app.applications.interactions.models import Tag, Rate
+from app.applications.interactions.models import Rate
 from app.applications.organisations.models import Club
 from app.applications.events.models import Event
 from app.applications.users.models import User
+from app.core.base.responses import FastJSONResponse
 from app.core.base.paginator import Paginator
 from app.core.base.extractor import Extractor
-from .utils import PostFilter, CommentFilter
+from app.core.scheduler.utils import schedule
+from .utils import PostFilter, CommentFilter, comment_thread
+from app.settings import config
 from .models import Post, Comment
 
 
@@ -36,6 +41,22 @@ async def get_post(
     return await PostOut.serialize(post, current_user)
 
 
+@post_router.get("/{id}/thread/", tags=["posts"])
+async def get_post_thread(
+    id: int,
+    depth: int = Query(3, ge=1, le=config.COMMENT_THREAD_MAX_DEPTH),
+    breadth: int = Query(20, ge=1, le=config.COMMENT_THREAD_MAX_BREADTH, title="Replies loaded per comment"),
+    page: int = Query(1, ge=1, title="Page of the top level, pages hold breadth comments"),
+    current_user: User = Depends(get_current_active_user_optional),
+):
+    post = await get_object_or_404(Post, id=id)
+    rows, has_next = await comment_thread(post.id, None, current_user, depth, breadth, page)
+    return FastJSONResponse({
+        "has_next": has_next,
+        "results": await CommentOut.serialize_thread(rows, current_user),
+    })
+
+
 @post_router.post("/", tags=["posts"])
 async def create_post(
     data: PostCreate,
@@ -60,9 +81,9 @@ async def create_post(
 
     post = await Post.create(**post_dict, creator=current_user)
 
-    await Tag.bulk_create(
-        Tag(name=name, item_id=post.id, item_type="Post") for name in data.tags
-    )
+    await add_tags("Post", post.id, data.tags)
+    # the timelines are written by a job so that a failed fan-out is retried
+    await schedule("fan_out_post", datetime.now(pytz.utc), {"post_id": post.id}, key=f"fan_out_post:{post.id}")
     return {"created": await PostOut.serialize(post, current_user), "media_upload": urls}
 
 
@@ -89,9 +110,7 @@ async def update_post(
     await post.update_from_dict(post_dict).save()
 
     if data.tags is not None:
-        await Tag.filter(Q(item_id=id, item_type="Post") & ~Q(name__in=data.tags)).delete()
-        for tag in data.tags:
-            await Tag.get_or_create(name=tag, item_id=id, item_type="Post")
+        await set_tags("Post", id, data.tags)
     return {"updated": await PostOut.serialize(post, current_user), "media_upload": urls}
 
 
@@ -144,6 +163,22 @@ async def get_comment(
     return await CommentOut.serialize(comment, current_user)
 
 
+@comment_router.get("/{id}/thread/", tags=["comments"])
+async def get_comment_thread(
+    id: int,
+    depth: int = Query(3, ge=1, le=config.COMMENT_THREAD_MAX_DEPTH),
+    breadth: int = Query(20, ge=1, le=config.COMMENT_THREAD_MAX_BREADTH, title="Replies loaded per comment"),
+    page: int = Query(1, ge=1, title="Page of the top level, pages hold breadth comments"),
+    current_user: User = Depends(get_current_active_user_optional),
+):
+    comment = await get_object_or_404(Comment, id=id)
+    rows, has_next = await comment_thread(comment.post_id, comment.id, current_user, depth, breadth, page)
+    return FastJSONResponse({
+        "has_next": has_next,
+        "results": await CommentOut.serialize_thread(rows, current_user),
+    })
+
+
 @comment_router.post("/", tags=["comments"])
 async def create_comment(
     data: CommentCreate,
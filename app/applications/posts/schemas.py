@@ -3,10 +3,15 @@ from tortoise.expressions import Subquery
 from pydantic import BaseModel, Field
 from tortoise.functions import Avg
 from typing import Optional
+import asyncio
 
+from app.applications.interactions.utils import rate_aggregates, user_rate
 from app.applications.interactions.models import Tag, Rate
-from app.applications.users.schemas import UserOut
-from app.core.base.schemas import BaseOutSchema
+from app.core.base.schemas import BaseOutSchema, field_group
+from app.applications.users.models import user_summaries
+from app.core.base.permissions import viewer_roles
+from app.core.base.context import load, loader
+from app.applications.organisations.models import Club
 from .models import Post, Comment
 
 
@@ -27,7 +32,11 @@ class PostOut(BaseOutSchema):
 
     @classmethod
     async def allowed_actions(cls, item: Post, user):
-        is_creator = await item.is_creator(user)
+        is_creator = user is not None and item.creator_id == user.id
+        if user is not None and item.author_club_id:
+            author_club = await load(Club, item.author_club_id)
+            is_creator = (is_creator and author_club is not None and author_club.post_policy) or \
+                (await viewer_roles(user)).is_admin(item.author_club_id)
         return {
             "can_hide": user is not None,
             "can_update": user is not None and is_creator,
@@ -36,24 +45,45 @@ class PostOut(BaseOutSchema):
         }
 
     @classmethod
-    async def add_fields(cls, item: Post, user):
-        item = await Post.annotate(
-            comment_count=Subquery(item.comments.all().count()),
-            rate_count=Subquery(Rate.filter(item_id=item.id, item_type="Post").count())
-        ).prefetch_related("creator", "author_club").get(id=item.id)
-        user_rate = await Rate.get_or_none(item_id=item.id, item_type="Post")
+    async def prefetch(cls, items: list[Post], user):
+        loads = []
+        if cls.wants("author_user"):
+            loads.append(user_summaries(item.creator_id for item in items if not item.is_anon))
+        if cls.wants("request_data"):
+            loads.append(loader(Club).load_many({item.author_club_id for item in items if item.author_club_id}))
+            loads.append(viewer_roles(user))
+        await asyncio.gather(*loads)
+
+    @field_group("request_data")
+    async def request_data_fields(cls, item: Post, user):
         return {
             "request_data": {
                 "allowed_actions": await PostOut.allowed_actions(item, user),
-                "user_rate": user_rate.rate if user_rate else None
-            },
-            "tags": await PostOut.tags(item),
-            "rate": await PostOut.rate(item),
-            "comment_count": item.comment_count,
-            "rate_count": item.rate_count,
-            "author_user": await UserOut.serialize(item.creator, user) if not item.is_anon else None
+                "user_rate": await user_rate("Post", item.id, user)
+            }
         }
 
+    @field_group("tags")
+    async def tag_fields(cls, item: Post, user):
+        return {"tags": await PostOut.tags(item)}
+
+    @field_group("rate")
+    async def rate_fields(cls, item: Post, user):
+        return {"rate": await PostOut.rate(item)}
+
+    @field_group("counts")
+    async def count_fields(cls, item: Post, user):
+        counts = await Post.annotate(
+            comment_count=Subquery(item.comments.all().count()),
+            rate_count=Subquery(Rate.filter(item_id=item.id, item_type="Post").count())
+        ).get(id=item.id)
+        return {"comment_count": counts.comment_count, "rate_count": counts.rate_count}
+
+    @field_group("author_user")
+    async def author_fields(cls, item: Post, user):
+        author = None if item.is_anon else (await user_summaries([item.creator_id])).get(item.creator_id)
+        return {"author_user": author}
+
 
 class CommentOut(BaseOutSchema):
     pydantic_model = pydantic_model_creator(Comment)
@@ -75,23 +105,76 @@ class CommentOut(BaseOutSchema):
         }
 
     @classmethod
-    async def add_fields(cls, item: Comment, user):
-        item = await Comment.annotate(
-            reply_count=Subquery(item.comments.all().count()),
-            rate_count=Subquery(Rate.filter(item_id=item.id, item_type="Comment").count())
-        ).prefetch_related("creator").get(id=item.id)
-        user_rate = await Rate.get_or_none(item_id=item.id, item_type="Comment")
+    async def prefetch(cls, items: list[Comment], user):
+        if cls.wants("author_user"):
+            await user_summaries(item.creator_id for item in items if not item.is_anon)
+
+    @field_group("request_data")
+    async def request_data_fields(cls, item: Comment, user):
         return {
             "requets_data": {
                 "allowed_actions": await CommentOut.allowed_actions(item, user),
-                "user_rate": user_rate.rate if user_rate else None
-            },
-            "rate": await CommentOut.rate(item),
-            "rate_count": item.rate_count,
-            "reply_count": item.reply_count,
-            "author_user": await UserOut.pydantic_model.from_tortoise_orm(item.creator) if not item.is_anon else None
+                "user_rate": await user_rate("Comment", item.id, user)
+            }
         }
 
+    @field_group("rate")
+    async def rate_fields(cls, item: Comment, user):
+        return {"rate": await CommentOut.rate(item)}
+
+    @field_group("counts")
+    async def count_fields(cls, item: Comment, user):
+        counts = await Comment.annotate(
+            reply_count=Subquery(item.comments.all().count()),
+            rate_count=Subquery(Rate.filter(item_id=item.id, item_type="Comment").count())
+        ).get(id=item.id)
+        return {"rate_count": counts.rate_count, "reply_count": counts.reply_count}
+
+    @field_group("author_user")
+    async def author_fields(cls, item: Comment, user):
+        author = None if item.is_anon else (await user_summaries([item.creator_id])).get(item.creator_id)
+        return {"author_user": author}
+
+    @classmethod
+    async def serialize_thread(cls, rows: list[dict], user) -> list[dict]:
+        """
+        Nests the rows of comment_thread under their parents, with counts, rates
+        and authors loaded once for the whole tree
+        """
+        ids = [row["id"] for row in rows]
+        comments = await Comment.filter(id__in=ids).order_by("created_at", "id")
+        (rates, rate_counts), authors = await asyncio.gather(
+            rate_aggregates("Comment", ids),
+            user_summaries(comment.creator_id for comment in comments if not comment.is_anon),
+        )
+        user_rates = {}
+        if user is not None:
+            user_rates = dict(await Rate.filter(
+                item_type="Comment", item_id__in=ids, rater_id=user.id
+            ).values_list("item_id", "rate"))
+        reply_counts = {row["id"]: row["reply_count"] for row in rows}
+        nodes = {}
+        for comment in comments:
+            nodes[comment.id] = {
+                **(await cls.pydantic_model.from_tortoise_orm(comment)).dict(),
+                "reply_to_id": comment.reply_to_id,
+                "requets_data": {
+                    "allowed_actions": await cls.allowed_actions(comment, user),
+                    "user_rate": user_rates.get(comment.id)
+                },
+                "rate": rates.get(comment.id),
+                "rate_count": rate_counts.get(comment.id, 0),
+                "reply_count": reply_counts[comment.id],
+                "author_user": None if comment.is_anon else authors.get(comment.creator_id),
+                "replies": [],
+            }
+        roots = []
+        for comment in comments:
+            # replies to the thread's root are the top level of a subtree
+            parent = nodes.get(comment.reply_to_id)
+            (parent["replies"] if parent is not None else roots).append(nodes[comment.id])
+        return roots
+
 
 class PostUpdate(BaseModel):
     is_anon: Optional[bool] = None
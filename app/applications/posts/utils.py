@@ -1,9 +1,16 @@
 from tortoise.expressions import Subquery, Q
+from tortoise.functions import Count
+from tortoise import Tortoise
 from typing import Optional
+import numpy as np
 
+from app.core.base.ranking import ranker, column, timestamps, lookup, membership, recency, proximity, saturate
+from app.applications.interactions.utils import rate_aggregates, order_items, Ordering
+from app.applications.users.utils import viewer_profile
 from app.applications.interactions.models import Tag
 from app.applications.users.models import Blocked
 from app.core.base.filter_set import FilterSet
+from app.settings import config
 from .models import Post, Comment
 
 
@@ -27,6 +34,7 @@ class PostFilter(FilterSet):
     class FunctionFilters(FilterSet.FunctionFilters):
         creator: Optional[int] = None
         tags: Optional[str] = None
+        order: Optional[Ordering] = None
 
     class Functions(FilterSet.Functions):
         @staticmethod
@@ -40,6 +48,10 @@ class PostFilter(FilterSet):
                 id__in=Subquery(Tag.filter(item_type="Place", name__in=tags).values("item_id"))
             ), []
 
+        @staticmethod
+        def order(value: Ordering, queryset, user):
+            return order_items(queryset, value, "Post", "posts"), []
+
 
 class CommentFilter(FilterSet):
     model = Comment
@@ -68,3 +80,93 @@ class CommentFilter(FilterSet):
         @staticmethod
         def post(value: int, queryset, user):
             return queryset.filter(post_id=value, reply_to_id=None), []
+
+
+VISIBLE_COMMENT_SQL = '''NOT EXISTS (
+            SELECT 1 FROM "blocked" WHERE "blocking_user_id" = $4 AND "blocked_user_id" = "c"."creator_id"
+        ) AND NOT EXISTS (
+            SELECT 1 FROM "hides" WHERE "hider_id" = $4 AND "item_type" = 'Comment' AND "item_id" = "c"."id"
+        )'''
+
+THREAD_SQL = '''
+WITH RECURSIVE "thread" AS (
+    SELECT "top"."id", "top"."reply_to_id", 1 AS "depth" FROM (
+        SELECT "c"."id", "c"."reply_to_id" FROM "comments" AS "c"
+        WHERE "c"."post_id" = $1 AND {anchor} AND {visible}
+        ORDER BY "c"."created_at", "c"."id" LIMIT $3 OFFSET $5
+    ) AS "top"
+    UNION ALL
+    SELECT "reply"."id", "reply"."reply_to_id", "thread"."depth" + 1 FROM "thread" CROSS JOIN LATERAL (
+        SELECT "c"."id", "c"."reply_to_id" FROM "comments" AS "c"
+        WHERE "c"."post_id" = $1 AND "c"."reply_to_id" = "thread"."id" AND {visible}
+        ORDER BY "c"."created_at", "c"."id" LIMIT $3
+    ) AS "reply"
+    WHERE "thread"."depth" < $2
+)
+SELECT "thread"."id", "thread"."reply_to_id", "thread"."depth", (
+    SELECT count(*) FROM "comments" AS "c" WHERE "c"."post_id" = $1 AND "c"."reply_to_id" = "thread"."id"
+) AS "reply_count", EXISTS (
+    SELECT 1 FROM "comments" AS "c" WHERE "c"."post_id" = $1 AND {anchor} AND {visible}
+    ORDER BY "c"."created_at", "c"."id" OFFSET $5 + $3
+) AS "has_next"
+FROM "thread"
+ORDER BY "thread"."depth", "thread"."id"
+LIMIT $6
+'''
+
+
+async def comment_thread(
+    post_id: int, root_id: Optional[int], user, depth: int, breadth: int, page: int = 1
+) -> tuple[list[dict], bool]:
+    """
+    Comments of a post, or replies under one of its comments, down to depth levels with at most
+    breadth oldest replies per comment, read with one recursive query. The top level is paged by
+    breadth and the whole tree is capped at COMMENT_THREAD_MAX_NODES. Returns the rows and
+    whether a next page of the top level exists.
+    """
+    # the cap keeps shallow levels first, so the parent of every returned reply is returned too
+    params = [
+        post_id, depth, breadth, user.id if user else None, (page - 1) * breadth, config.COMMENT_THREAD_MAX_NODES
+    ]
+    if root_id is None:
+        anchor = '"c"."reply_to_id" IS NULL'
+    else:
+        params.append(root_id)
+        anchor = '"c"."reply_to_id" = $7'
+    rows = await Tortoise.get_connection("default").execute_query_dict(
+        THREAD_SQL.format(anchor=anchor, visible=VISIBLE_COMMENT_SQL), params
+    )
+    return rows, bool(rows) and rows[0]["has_next"]
+
+
+@ranker("Post")
+async def post_features(candidates, user):
+    rows = await candidates.values(
+        "id", "created_at", "latitude", "longitude", "creator_id", "is_anon", "author_club_id", "event_id",
+        "author_club__category_id"
+    )
+    ids = column(rows, "id").astype(np.int64)
+    item_ids = ids.tolist()
+    rates, rate_counts = await rate_aggregates("Post", item_ids)
+    comment_counts = dict(await Comment.filter(post_id__in=item_ids).group_by("post_id").annotate(
+        count=Count("id")
+    ).values_list("post_id", "count"))
+    viewer = await viewer_profile(user)
+    creators = np.fromiter(
+        (-1 if row["is_anon"] or row["creator_id"] is None else row["creator_id"] for row in rows),
+        dtype=np.float64, count=len(rows)
+    )
+    return ids, {
+        "recency": recency(timestamps(rows, "created_at"), config.RANKING_HALF_LIFE_HOURS),
+        "rate": lookup(ids, rates),
+        "rate_count": saturate(lookup(ids, rate_counts)),
+        "comments": saturate(lookup(ids, comment_counts)),
+        "proximity": proximity(
+            column(rows, "latitude"), column(rows, "longitude"), viewer["latitude"], viewer["longitude"],
+            config.RANKING_DISTANCE_SCALE_KM
+        ),
+        "interest": membership(column(rows, "author_club__category_id"), viewer["interests"]),
+        "affinity": membership(creators, viewer["connections"])
+        + membership(column(rows, "author_club_id"), viewer["clubs"])
+        + membership(column(rows, "event_id"), viewer["events"]),
+    }
@@ -0,0 +1,222 @@
+from collections import Counter, defaultdict
+from typing import Any, Iterable, Optional
+from array import array
+import functools
+import bisect
+import heapq
+
+EMPTY = array("q")
+
+
+def _insert(items: array, value: int) -> bool:
+    index = bisect.bisect_left(items, value)
+    if index < len(items) and items[index] == value:
+        return False
+    items.insert(index, value)
+    return True
+
+
+def _remove(items: array, value: int) -> bool:
+    index = bisect.bisect_left(items, value)
+    if index < len(items) and items[index] == value:
+        del items[index]
+        return True
+    return False
+
+
+def _build(pairs: Iterable[tuple[int, int]], symmetric: bool) -> dict[int, array]:
+    lists = defaultdict(list)
+    for a, b in pairs:
+        lists[a].append(b)
+        if symmetric:
+            lists[b].append(a)
+    return {key: array("q", sorted(set(values))) for key, values in lists.items()}
+
+
+def _journaled(method):
+    # edits made while a reload reads the database are replayed on the rebuilt graph
+    @functools.wraps(method)
+    def record(self, *args):
+        if self.journal is not None:
+            self.journal.append((method, args))
+        return method(self, *args)
+    return record
+
+
+class ConnectionGraph:
+    """
+    Accepted connections of every user kept as sorted int arrays, together with
+    blocks, universities and club memberships, for mutual-connection counts and
+    people-you-may-know suggestions without going to the database.
+    """
+
+    def __init__(self, mutual_weight: float = 1.0, university_weight: float = 2.0, club_weight: float = 1.0,
+                 max_candidates: int = 5000):
+        self.mutual_weight = mutual_weight
+        self.university_weight = university_weight
+        self.club_weight = club_weight
+        self.max_candidates = max_candidates
+        self.adjacency: dict[int, array] = {}
+        self.blocks: dict[int, array] = {}
+        self.universities: dict[int, int] = {}
+        self.university_students: dict[int, array] = {}
+        self.clubs: dict[int, array] = {}
+        self.club_members: dict[int, array] = {}
+        self.journal: Optional[list] = None
+        self.is_loaded = False
+
+    @staticmethod
+    def build(connections: Iterable[tuple[int, int]], blocks: Iterable[tuple[int, int]],
+              universities: Iterable[tuple[int, int]], memberships: Iterable[tuple[int, int]]) -> dict[str, Any]:
+        """
+        Structures of a whole graph, connections and blocks are (user, user) pairs,
+        universities are (user, university) and memberships (user, club) pairs.
+        Touches no shared state so it can run in a worker thread.
+        """
+        memberships = list(memberships)
+        universities = dict(universities)
+        return {
+            "adjacency": _build(connections, symmetric=True),
+            "blocks": _build(blocks, symmetric=True),
+            "universities": universities,
+            "university_students": _build(
+                ((university_id, user_id) for user_id, university_id in universities.items()), symmetric=False
+            ),
+            "clubs": _build(memberships, symmetric=False),
+            "club_members": _build(((club_id, user_id) for user_id, club_id in memberships), symmetric=False),
+        }
+
+    def begin_reload(self):
+        self.journal = []
+
+    def abort_reload(self):
+        self.journal = None
+
+    def swap(self, structures: dict[str, Any]):
+        journal, self.journal = self.journal or [], None
+        for name, value in structures.items():
+            setattr(self, name, value)
+        for method, args in journal:
+            method(self, *args)
+        self.is_loaded = True
+
+    def load(self, connections: Iterable[tuple[int, int]], blocks: Iterable[tuple[int, int]],
+             universities: Iterable[tuple[int, int]], memberships: Iterable[tuple[int, int]]):
+        self.swap(self.build(connections, blocks, universities, memberships))
+
+    def edge_count(self) -> int:
+        return sum(map(len, self.adjacency.values())) // 2
+
+    def connections(self, user_id: int) -> array:
+        return self.adjacency.get(user_id, EMPTY)
+
+    @_journaled
+    def connect(self, a: int, b: int):
+        _insert(self.adjacency.setdefault(a, array("q")), b)
+        _insert(self.adjacency.setdefault(b, array("q")), a)
+
+    @_journaled
+    def disconnect(self, a: int, b: int):
+        _remove(self.adjacency.get(a, array("q")), b)
+        _remove(self.adjacency.get(b, array("q")), a)
+
+    @_journaled
+    def block(self, a: int, b: int):
+        self.disconnect(a, b)
+        _insert(self.blocks.setdefault(a, array("q")), b)
+        _insert(self.blocks.setdefault(b, array("q")), a)
+
+    @_journaled
+    def unblock(self, a: int, b: int):
+        _remove(self.blocks.get(a, array("q")), b)
+        _remove(self.blocks.get(b, array("q")), a)
+
+    @_journaled
+    def set_university(self, user_id: int, university_id: int | None):
+        previous = self.universities.pop(user_id, None)
+        if previous is not None:
+            _remove(self.university_students.get(previous, array("q")), user_id)
+        if university_id is not None:
+            self.universities[user_id] = university_id
+            _insert(self.university_students.setdefault(university_id, array("q")), user_id)
+
+    @_journaled
+    def join_club(self, user_id: int, club_id: int):
+        _insert(self.clubs.setdefault(user_id, array("q")), club_id)
+        _insert(self.club_members.setdefault(club_id, array("q")), user_id)
+
+    @_journaled
+    def leave_club(self, user_id: int, club_id: int):
+        _remove(self.clubs.get(user_id, array("q")), club_id)
+        _remove(self.club_members.get(club_id, array("q")), user_id)
+
+    @_journaled
+    def remove_user(self, user_id: int):
+        for other in self.adjacency.pop(user_id, EMPTY):
+            _remove(self.adjacency.get(other, array("q")), user_id)
+        for other in self.blocks.pop(user_id, EMPTY):
+            _remove(self.blocks.get(other, array("q")), user_id)
+        for club_id in self.clubs.pop(user_id, EMPTY):
+            _remove(self.club_members.get(club_id, array("q")), user_id)
+        self.set_university(user_id, None)
+
+    def mutual_count(self, a: int, b: int) -> int:
+        first, second = self.connections(a), self.connections(b)
+        if len(first) > len(second):
+            first, second = second, first
+        return len(set(first).intersection(second)) if first else 0
+
+    def mutual_counts(self, user_id: int, others: Iterable[int]) -> dict[int, int]:
+        connections = set(self.connections(user_id))
+        return {
+            other: len(connections.intersection(self.connections(other))) if connections else 0
+            for other in others
+        }
+
+    def mutual_connections(self, a: int, b: int) -> list[int]:
+        return sorted(set(self.connections(a)).intersection(self.connections(b)))
+
+    def excluded(self, user_id: int) -> set[int]:
+        excluded = set(self.connections(user_id))
+        excluded.update(self.blocks.get(user_id, EMPTY))
+        excluded.add(user_id)
+        return excluded
+
+    def second_degree(self, user_id: int) -> Counter:
+        """
+        Friends of friends mapped to the number of connections they share with the user
+        """
+        candidates = Counter()
+        for friend in self.connections(user_id):
+            candidates.update(self.connections(friend))
+        for user in self.excluded(user_id):
+            candidates.pop(user, None)
+        return candidates
+
+    def suggestions(self, user_id: int, limit: int) -> list[tuple[int, float]]:
+        """
+        Ranked (user, score) pairs mixing mutual connections, the same university and shared clubs
+        """
+        excluded = self.excluded(user_id)
+        mutuals = self.second_degree(user_id)
+        shared_clubs = Counter()
+        for club_id in self.clubs.get(user_id, EMPTY):
+            shared_clubs.update(self.club_members.get(club_id, EMPTY)[:self.max_candidates])
+        university_id = self.universities.get(user_id)
+        classmates = self.university_students.get(university_id, EMPTY) if university_id is not None else EMPTY
+
+        candidates = set(mutuals)
+        candidates.update(shared_clubs)
+        candidates.update(classmates[:self.max_candidates])
+        candidates.difference_update(excluded)
+        scores = (
+            (
+                candidate,
+                self.mutual_weight * mutuals.get(candidate, 0)
+                + self.club_weight * shared_clubs.get(candidate, 0)
+                + (self.university_weight if university_id is not None
+                   and self.universities.get(candidate) == university_id else 0.0)
+            )
+            for candidate in candidates
+        )
+        return heapq.nlargest(limit, scores, key=lambda item: (item[1], -item[0]))
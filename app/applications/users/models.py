@@ -2,7 +2,12 @@ from tortoise.expressions import Q
 from tortoise import fields
 
 from app.core.base.models import BaseCreatedAtModel, LocationModel, BaseDBModel, MediaModel
-from app.core.auth.utils import password
+from app.core.auth.utils.cache import invalidate_user
+from app.core.base.media_manager import S3
+from app.core.base.cache import TTLCache
+from app.settings import config
+
+summaries = TTLCache("user_summaries", config.USER_SUMMARY_CACHE_SIZE, config.USER_SUMMARY_CACHE_TTL)
 
 
 class User(BaseDBModel, BaseCreatedAtModel, LocationModel, MediaModel):
@@ -67,21 +72,23 @@ class User(BaseDBModel, BaseCreatedAtModel, LocationModel, MediaModel):
     )
 
     async def connection_status(self, user):
-        if self == user:
-            return Connection.Status.me
-        connection = await Connection.get_or_none(
-            Q(from_user=user, to_user=self) | Q(from_user=self, to_user=user)
-        ).prefetch_related("from_user", "to_user")
-        if connection:
-            if connection.is_accepted:
-                return Connection.Status.connected
-            return Connection.Status.request_sent if connection.from_user == self else Connection.Status.request_received
-        return Connection.Status.not_connected
+        relationships = await resolve_relationships(self, [user.id], with_blocks=False)
+        return relationships[user.id]["connection_status"]
+
+    async def save(self, *args, **kwargs):
+        await super().save(*args, **kwargs)
+        invalidate_user(self.id)
+        summaries.pop(self.id)
+
+    async def delete(self, *args, **kwargs):
+        user_id = self.id
+        await super().delete(*args, **kwargs)
+        invalidate_user(user_id)
+        summaries.pop(user_id)
 
     @classmethod
-    async def create(cls, user) -> "User":
-        user_dict = user.dict()
-        password_hash = password.get_password_hash(password=user.password)
+    async def create(cls, user, password_hash: str) -> "User":
+        user_dict = user.dict(exclude={"password"})
         model = cls(**user_dict, password_hash=password_hash)
         await model.save()
         return model
@@ -128,3 +135,67 @@ class Blocked(BaseDBModel):
     blocked_user: fields.ForeignKeyRelation = fields.ForeignKeyField(
         "models.User", related_name="blocked"
     )
+
+
+async def resolve_relationships(viewer: User | None, user_ids: list[int], with_blocks: bool = True) -> dict[int, dict]:
+    """
+    Connection status and block flags of the viewer towards every given user,
+    one query over connections and one over blocked.
+    """
+    relationships = {
+        user_id: {
+            "connection_status": Connection.Status.not_connected,
+            "is_blocked": False,
+            "is_blocked_by": False,
+        } for user_id in user_ids
+    }
+    if viewer is None or not user_ids:
+        return relationships
+    if viewer.id in relationships:
+        relationships[viewer.id]["connection_status"] = Connection.Status.me
+    connections = await Connection.filter(
+        Q(from_user_id=viewer.id, to_user_id__in=user_ids) | Q(to_user_id=viewer.id, from_user_id__in=user_ids)
+    ).values_list("from_user_id", "to_user_id", "is_accepted")
+    for from_user_id, to_user_id, is_accepted in connections:
+        if from_user_id == viewer.id:
+            other, status = to_user_id, Connection.Status.request_sent
+        else:
+            other, status = from_user_id, Connection.Status.request_received
+        if other == viewer.id:
+            continue
+        relationships[other]["connection_status"] = Connection.Status.connected if is_accepted else status
+    if with_blocks:
+        blocks = await Blocked.filter(
+            Q(blocking_user_id=viewer.id, blocked_user_id__in=user_ids) | Q(blocked_user_id=viewer.id, blocking_user_id__in=user_ids)
+        ).values_list("blocking_user_id", "blocked_user_id")
+        for blocking_user_id, blocked_user_id in blocks:
+            if blocking_user_id == viewer.id:
+                relationships[blocked_user_id]["is_blocked"] = True
+            if blocked_user_id == viewer.id:
+                relationships[blocking_user_id]["is_blocked_by"] = True
+    return relationships
+
+
+async def user_summaries(user_ids) -> dict[int, dict]:
+    """
+    Compact projection of users embedded as authors: id, username, names and avatar.
+    Kept across requests, only the users missing from the cache are read, in one query.
+    """
+    found, missing = {}, []
+    for user_id in set(user_ids):
+        summary = summaries.get(user_id)
+        if summary is None:
+            missing.append(user_id)
+        else:
+            found[user_id] = summary
+    if missing:
+        for row in await User.filter(id__in=missing).values("id", "username", "first_name", "last_name", "media_dict"):
+            media = (row.pop("media_dict") or {}).get("media") or [""]
+            # signed urls expire, the file name is cached and signed on the way out
+            summary = {**row, "avatar": media[0] or None}
+            summaries.set(row["id"], summary)
+            found[row["id"]] = summary
+    return {
+        user_id: {**summary, "avatar": S3.get_file_url(summary["avatar"]) if summary["avatar"] else None}
+        for user_id, summary in found.items()
+    }
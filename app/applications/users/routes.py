@@ -1,17 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Header, Response
 from tortoise.expressions import Q
+from typing import Optional
 
 from app.core.auth.utils.contrib import get_current_active_user_optional, get_current_active_user
 from app.applications.interactions.schemas import NotificationOut, ReportOut
 from app.applications.interactions.models import Category, Notification
 from app.applications.interactions.utils import ReportFilter
-from app.core.auth.utils.password import get_password_hash
+from app.core.auth.utils.password import hash_password
 from .schemas import UserOut, UserUpdate, LocationUpdate
 from app.core.base.utils import get_object_or_404
-from .models import User, Connection, University
+from .models import User, Connection
 from app.core.base.extractor import Extractor
+from app.core.base.responses import FastJSONResponse, not_modified
 from app.core.base.paginator import Paginator
-from .utils import UserFilter
+from .utils import UserFilter, update_location, universities, connection_graph
 
 router = APIRouter()
 
@@ -52,7 +54,7 @@ async def update_me(
     user_dict["media_dict"] = media_dict
 
     if data.password is not None:
-        user_dict["password_hash"] = get_password_hash(data.password)
+        user_dict["password_hash"] = await hash_password(data.password)
 
     if data.interests:
         await current_user.interests.add(
@@ -68,6 +70,8 @@ async def update_me(
             pass
 
     await current_user.update_from_dict(user_dict).save()
+    if data.university_id is not None:
+        connection_graph.set_university(current_user.id, data.university_id)
 
     return {"updated": await UserOut.serialize(current_user, current_user), "media_upload": urls}
 
@@ -77,7 +81,7 @@ async def update_my_location(
     location_data: LocationUpdate,
     current_user: User = Depends(get_current_active_user)
 ):
-    await current_user.update_from_dict(location_data.dict()).save()
+    update_location(current_user.id, location_data.latitude, location_data.longitude)
     return location_data
 
 
@@ -86,6 +90,7 @@ async def delete_me(
     current_user: User = Depends(get_current_active_user)
 ):
     await current_user.delete()
+    connection_graph.remove_user(current_user.id)
     return current_user
 
 
@@ -106,6 +111,7 @@ async def user_connect(
             return await current_user.connection_status(user)
         recv.is_accepted = True
         await recv.save()
+        connection_graph.connect(current_user.id, user.id)
         await Notification.create_and_sent([user], Notification.Type.connect_accepted, current_user)
         return await current_user.connection_status(user)
     await Connection.create(from_user=current_user, to_user=user, is_accepted=False)
@@ -124,10 +130,12 @@ async def user_disconnect(
     sent: Connection = await Connection.get_or_none(from_user=current_user, to_user=user)
     if sent:
         await sent.delete()
+        connection_graph.disconnect(current_user.id, user.id)
         return await current_user.connection_status(user)
     recv: Connection = await Connection.get_or_none(from_user=user, to_user=current_user)
     if recv:
         await recv.delete()
+        connection_graph.disconnect(current_user.id, user.id)
         return await current_user.connection_status(user)
     return await current_user.connection_status(user)
 
@@ -145,10 +153,12 @@ async def user_block(
         )
     if await current_user.blocked_users.filter(id=id).exists():
         await current_user.blocked_users.remove(user)
+        connection_graph.unblock(current_user.id, user.id)
         return False
     else:
         await Connection.filter(Q(from_user=user, to_user=current_user) | Q(from_user=current_user, to_user=user)).delete()
         await current_user.blocked_users.add(user)
+        connection_graph.block(current_user.id, user.id)
         return True
 
 
@@ -212,14 +222,53 @@ async def get_connection_requests_from_me(
     return await paginator(sent, UserOut, current_user)
 
 
+@router.get("/me/suggestions/", status_code=200, tags=["users"])
+async def get_connection_suggestions(
+    paginator: Paginator = Depends(),
+    current_user: User = Depends(get_current_active_user),
+):
+    offset = (paginator.page - 1) * paginator.page_size
+    ranked = connection_graph.suggestions(current_user.id, offset + paginator.page_size + 1)
+    page = ranked[offset:offset + paginator.page_size]
+    users = {user.id: user for user in await User.filter(id__in=[user_id for user_id, _ in page], is_active=True)}
+    items = [users[user_id] for user_id, _ in page if user_id in users]
+    return FastJSONResponse({
+        "has_next": len(ranked) > offset + paginator.page_size,
+        "results": await UserOut.serialize_page(items, current_user)
+    })
+
+
+@router.get("/{id}/mutual-connections/", status_code=200, tags=["users"])
+async def get_mutual_connections(
+    id: int,
+    paginator: Paginator = Depends(),
+    current_user: User = Depends(get_current_active_user),
+):
+    mutuals = User.filter(id__in=connection_graph.mutual_connections(current_user.id, id)).order_by("id"), []
+    return await paginator(mutuals, UserOut, current_user)
+
+
 university_router = APIRouter()
 
 
 @university_router.get("/", status_code=200, tags=["users"])
-async def get_universities():
-    universities = await University.all()
+async def get_universities(
+    response: Response,
+    paginator: Paginator = Depends(),
+    search_text: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+):
+    items, version = await universities.get()
+    cached = not_modified(if_none_match, version, response)
+    if cached is not None:
+        return cached
+    if search_text:
+        search_text = search_text.casefold()
+        items = [item for item in items if search_text in item["name"].casefold()]
+    offset = (paginator.page - 1) * paginator.page_size
     return {
-        "has_next": False,
-        "count": len(universities),
-        "results": universities
+        "has_next": offset + paginator.page_size < len(items),
+        "count": len(items),
+        "version": version,
+        "results": items[offset:offset + paginator.page_size]
     }
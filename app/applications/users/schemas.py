@@ -4,8 +4,9 @@ from tortoise.expressions import Q, Subquery
 from typing import Optional
 from datetime import date
 
-from app.core.base.schemas import BaseOutSchema
-from .models import User, Connection, Blocked
+from app.core.base.schemas import BaseOutSchema, field_group
+from .models import User, Connection, resolve_relationships
+from .utils import connection_graph
 
 
 class UserOut(BaseOutSchema):
@@ -31,24 +32,46 @@ class UserOut(BaseOutSchema):
         }
 
     @classmethod
-    async def add_fields(cls, item: User, user):
+    async def prefetch(cls, items: list[User], user):
+        if not cls.wants("request_data"):
+            return
+        relationships = await resolve_relationships(user, [item.id for item in items])
+        for item in items:
+            item.relationship = relationships[item.id]
+
+    @field_group("request_data")
+    async def request_data_fields(cls, item: User, user):
+        relationship = getattr(item, "relationship", None)
+        if relationship is None:
+            relationship = (await resolve_relationships(user, [item.id]))[item.id]
+        is_blocked_by = relationship["is_blocked_by"]
+        is_blocked = relationship["is_blocked"]
+        return {
+            "request_data": {
+                "allowed_actions": await UserOut.allowed_actions(item, user, not (is_blocked_by or is_blocked)),
+                "connection_status": relationship["connection_status"],
+                "is_blocked_by": is_blocked_by,
+                "is_blocked": is_blocked,
+                "mutual_connection_count": 0 if user is None else connection_graph.mutual_count(user.id, item.id),
+            }
+        }
+
+    @field_group("location")
+    async def location_fields(cls, item: User, user):
+        return {
+            "latitude": item.latitude if (not item.private_profile) or (item == user) else None,
+            "longitude": item.longitude if (not item.private_profile) or (item == user) else None,
+        }
+
+    @field_group("counts")
+    async def count_fields(cls, item: User, user):
         counts = await User.get(id=item.id).annotate(
             post_count=Subquery(item.posts.all().count()),
             hosted_event_count=Subquery(item.hosted_events.all().count()),
             attended_event_count=Subquery(item.attendance.all().count()),
         )
         connection_count = await Connection.filter(is_accepted=True).filter(Q(from_user=item) | Q(to_user=item)).count()
-        is_blocked_by = await Blocked.filter(blocking_user=item, blocked_user=user).exists()
-        is_blocked = await Blocked.filter(blocked_user=item, blocking_user=user).exists()
         return {
-            "request_data": {
-                "allowed_actions": await UserOut.allowed_actions(item, user, not (is_blocked_by or is_blocked)),
-                "connection_status": Connection.Status.not_connected if user is None else await user.connection_status(item),
-                "is_blocked_by": is_blocked_by,
-                "is_blocked": is_blocked
-            },
-            "latitude": item.latitude if (not item.private_profile) or (item == user) else None,
-            "longitude": item.longitude if (not item.private_profile) or (item == user) else None,
             "post_count": counts.post_count,
             "connection_count": connection_count,
             "hosted_event_count": counts.hosted_event_count,
@@ -73,5 +96,5 @@ class UserUpdate(BaseModel):
 
 
 class LocationUpdate(BaseModel):
-    latitude: float
-    longitude: float
+    latitude: float = Field(..., ge=-90, le=90)
+    longitude: float = Field(..., ge=-180, le=180)
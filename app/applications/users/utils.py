@@ -1,16 +1,97 @@
 from tortoise.expressions import Q, Subquery
 from tortoise.functions import Sum
 from datetime import datetime
+from decimal import Decimal
 from typing import Optional
-
+import asyncio
+import pytz
+
+from app.applications.organisations.models import Membership
+from app.applications.events.models import Attendee
+from app.core.base.write_buffer import WriteBehindBuffer
+from app.core.auth.utils.cache import invalidate_users
+from app.core.base.reference import ReferenceData
+from app.core.base.cache import TTLCache
+from .models import User, Connection, Blocked, University
+from .graph import ConnectionGraph
 from app.core.base.filter_set import FilterSet
-from .models import User, Connection, Blocked
+from app.settings import config
+
+user_writes = WriteBehindBuffer(
+    User,
+    {"last_login": "timestamptz", "latitude": "numeric", "longitude": "numeric"},
+    max_entries=config.USER_WRITE_BUFFER_MAX_ENTRIES,
+    after_flush=invalidate_users,
+)
 
 
 async def update_last_login(user_id: int) -> None:
-    user = await User.get(id=user_id)
-    user.last_login = datetime.now()
-    await user.save()
+    user_writes.record(user_id, last_login=datetime.now(pytz.utc))
+
+
+def update_location(user_id: int, latitude: float, longitude: float) -> None:
+    user_writes.record(user_id, latitude=Decimal(str(latitude)), longitude=Decimal(str(longitude)))
+
+
+async def load_universities() -> list[dict]:
+    return await University.all().order_by("name").values(
+        "id", "name", "latitude", "longitude", "location_decription"
+    )
+
+
+universities = ReferenceData(load_universities, config.REFERENCE_DATA_TTL_SECONDS)
+
+connection_graph = ConnectionGraph(
+    mutual_weight=config.CONNECTION_SUGGESTION_MUTUAL_WEIGHT,
+    university_weight=config.CONNECTION_SUGGESTION_UNIVERSITY_WEIGHT,
+    club_weight=config.CONNECTION_SUGGESTION_CLUB_WEIGHT,
+    max_candidates=config.CONNECTION_SUGGESTION_MAX_CANDIDATES,
+)
+
+viewer_profiles = TTLCache(
+    "viewer_profiles", maxsize=config.RANKING_WINDOW_CACHE_SIZE, ttl=config.RANKING_WINDOW_TTL_SECONDS
+)
+
+
+async def viewer_profile(user: Optional[User]) -> dict:
+    """
+    What the ranking needs to know about a viewer: location, interests, clubs, events and connections
+    """
+    if user is None:
+        return {"latitude": None, "longitude": None, "interests": set(), "clubs": set(), "events": set(),
+                "connections": set()}
+    profile = viewer_profiles.get(user.id)
+    if profile is None:
+        profile = {
+            "latitude": user.latitude,
+            "longitude": user.longitude,
+            "interests": set(await user.interests.all().values_list("id", flat=True)),
+            "clubs": set(await Membership.filter(user_id=user.id).values_list("club_id", flat=True)),
+            "events": set(await Attendee.filter(user_id=user.id).values_list("event_id", flat=True)),
+            "connections": set(connection_graph.connections(user.id)),
+        }
+        viewer_profiles.set(user.id, profile)
+    return profile
+
+
+async def load_connection_graph():
+    """
+    Full rebuild, the graph is kept current by incremental updates and this only reconciles
+    edits made by other workers. The build runs off the event loop and is swapped in at once.
+    """
+    connection_graph.begin_reload()
+    try:
+        structures = await asyncio.to_thread(
+            ConnectionGraph.build,
+            await Connection.filter(is_accepted=True).values_list("from_user_id", "to_user_id"),
+            await Blocked.all().values_list("blocking_user_id", "blocked_user_id"),
+            await User.filter(university_id__not_isnull=True).values_list("id", "university_id"),
+            await Membership.all().values_list("user_id", "club_id"),
+        )
+    except BaseException:
+        connection_graph.abort_reload()
+        raise
+    connection_graph.swap(structures)
 
 
 class UserFilter(FilterSet):
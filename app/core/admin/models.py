@@ -8,3 +8,13 @@ class Admin(Model):
     id = fields.IntField(pk=True)
     username = fields.CharField(max_length=255)
     password = fields.CharField(max_length=255)
+
+
+class AdminToken(Model):
+    class Meta:
+        table = "admin_tokens"
+    id = fields.IntField(pk=True)
+    jti = fields.CharField(max_length=64, unique=True)
+    admin_id = fields.IntField(index=True)
+    expires_at = fields.DatetimeField(index=True)
+    is_revoked = fields.BooleanField(default=False)
@@ -2,12 +2,18 @@ from fastapi import APIRouter, HTTPException, Depends, File, UploadFile
 from tortoise.exceptions import IntegrityError
 
 from app.applications.organisations.models import Place, Club
-from .schemas import AdminCreate, LanguageCreate, AdminOut
+from .schemas import AdminCreate, LanguageCreate, AdminOut, AdminTokenOut
 from app.applications.interactions.models import Category
-from .utils import get_password_hash, get_current_admin
+from app.applications.interactions.utils import categories
+from app.core.auth.utils.password import hash_password, password_pool_stats
+from .utils import get_current_admin, get_basic_admin, create_admin_token, revoke_admin_tokens
 from app.core.base.utils import get_object_or_404
+from app.core.base.schemas import field_cost_stats
+from app.core.base.cache import cache_stats
 from app.core.base.media_manager import S3
+from app.core.lang.utils import language_packs
 from app.core.lang.models import Language
+from app.settings import config
 from .models import Admin
 
 router = APIRouter()
@@ -17,7 +23,7 @@ router = APIRouter()
 async def init_admin(admin: AdminCreate):
     count = await Admin.all().count()
     if count == 0:
-        hashed_password = get_password_hash(admin.password)
+        hashed_password = await hash_password(admin.password)
         try:
             await Admin.create(username=admin.username, password=hashed_password)
             return {"status": "Admin created"}
@@ -27,6 +33,44 @@ async def init_admin(admin: AdminCreate):
         raise HTTPException(status_code=400, detail="Admin already exists")
 
 
+@router.post("/login/", response_model=AdminTokenOut, tags=["admin"])
+async def login_admin(
+    current_admin: Admin = Depends(get_basic_admin),
+):
+    return {
+        "access_token": await create_admin_token(current_admin),
+        "token_type": "bearer",
+        "expires_in": config.ADMIN_TOKEN_EXPIRE_MINUTES * 60,
+    }
+
+
+@router.post("/logout/", tags=["admin"])
+async def logout_admin(
+    current_admin: Admin = Depends(get_current_admin),
+):
+    token_id = getattr(current_admin, "token_id", None)
+    if token_id is None:
+        raise HTTPException(status_code=400, detail="Not logged in with a token")
+    await revoke_admin_tokens(jti=token_id)
+    return {"status": "Token revoked"}
+
+
+@router.post("/{id}/revoke-tokens/", tags=["admin"])
+async def revoke_tokens(
+    id: int,
+    current_admin: Admin = Depends(get_current_admin),
+):
+    await revoke_admin_tokens(admin_id=id)
+    return {"status": "Tokens revoked"}
+
+
+@router.get("/stats/", tags=["admin"])
+async def get_stats(
+    current_admin: Admin = Depends(get_current_admin),
+):
+    return {"caches": cache_stats(), "password_pool": password_pool_stats(), "field_groups": field_cost_stats()}
+
+
 @router.get("/", tags=["admin"])
 async def get_admins(
     current_admin: Admin = Depends(get_current_admin),
@@ -39,7 +83,7 @@ async def create_admin(
     admin: AdminCreate,
     current_admin: Admin = Depends(get_current_admin),
 ):
-    hashed_password = get_password_hash(admin.password)
+    hashed_password = await hash_password(admin.password)
     try:
         await Admin.create(username=admin.username, password=hashed_password)
         return {"status": "Admin created"}
@@ -53,6 +97,7 @@ async def delete_admin(
     current_admin: Admin = Depends(get_current_admin),
 ):
     admin: Admin = await get_object_or_404(Admin, id=id)
+    await revoke_admin_tokens(admin_id=admin.id)
     await admin.delete()
 
 
@@ -91,6 +136,7 @@ async def create_or_update_category(
     url, filename = S3.upload_file(extension)
     category.picture_name = filename
     await category.save()
+    categories.invalidate()
     cdn_response = S3.upload_file_to_space(url, category_picture.file)
     return {"message": "category created or updated", "category": category, "cdn status code": cdn_response.status_code}
 
@@ -102,6 +148,7 @@ async def delete_category(
 ):
     category: Category = await get_object_or_404(Category, name=name)
     await category.delete()
+    categories.invalidate()
     return {"message": "category deleted"}
 
 
@@ -112,6 +159,7 @@ async def create_or_update_language(
 ):
     lang, created = await Language.get_or_create(lang=lang_in.lang)
     await lang.update_from_dict({"data": lang_in.data}).save()
+    await language_packs.reload(lang_in.lang)
     return {"message": "language created"}
 
 
@@ -122,4 +170,5 @@ async def delete_languages(
 ):
     language: Language = await get_object_or_404(Language, lang=lang)
     await language.delete()
+    await language_packs.reload(lang)
     return {"message": "language deleted"}
@@ -16,3 +16,9 @@ class AdminCreate(BaseModel):
 class LanguageCreate(BaseModel):
     lang: SupportedLanguages
     data: dict
+
+
+class AdminTokenOut(BaseModel):
+    access_token: str
+    token_type: str
+    expires_in: int
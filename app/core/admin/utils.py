@@ -1,25 +1,108 @@
-from fastapi.security import HTTPBasic, HTTPBasicCredentials
+from fastapi.security import HTTPBasic, HTTPBasicCredentials, HTTPBearer, HTTPAuthorizationCredentials
+from datetime import datetime, timedelta
 from fastapi import Depends, HTTPException
-from passlib.context import CryptContext
+from jose.exceptions import JWTError
+from typing import Optional
+import uuid
+import pytz
 
-from .models import Admin
+from app.core.auth.utils.password import verify_password
+from app.core.auth.utils.jwt import encode_jwt, decode_jwt
+from app.core.scheduler.utils import job
+from .models import Admin, AdminToken
+from app.settings import config
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+admin_jwt_subject = "admin"
 
+security = HTTPBasic()
+optional_basic = HTTPBasic(auto_error=False)
+optional_bearer = HTTPBearer(auto_error=False)
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+# jti to expiry of revoked tokens that are still valid otherwise, an evicting cache
+# could forget a revocation so entries only leave once the token has expired
+revoked_tokens: dict[str, datetime] = {}
 
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+async def authenticate_admin(credentials: HTTPBasicCredentials) -> Admin:
+    admin = await Admin.get_or_none(username=credentials.username)
+    if not admin or not await verify_password(credentials.password, admin.password):
+        raise HTTPException(
+            status_code=401,
+            detail="Incorrect username or password",
+            headers={"WWW-Authenticate": "Basic"},
+        )
+    return admin
 
 
-security = HTTPBasic()
+async def get_basic_admin(credentials: HTTPBasicCredentials = Depends(security)):
+    return await authenticate_admin(credentials)
 
 
-async def get_current_admin(credentials: HTTPBasicCredentials = Depends(security)):
-    admin = await Admin.get_or_none(username=credentials.username)
-    if not admin or not verify_password(credentials.password, admin.password):
-        raise HTTPException(status_code=401, detail="Incorrect username or password")
-    return admin
+async def create_admin_token(admin: Admin) -> str:
+    jti = uuid.uuid4().hex
+    expires_at = datetime.now(pytz.utc) + timedelta(minutes=config.ADMIN_TOKEN_EXPIRE_MINUTES)
+    await AdminToken.create(jti=jti, admin_id=admin.id, expires_at=expires_at)
+    return encode_jwt({
+        "sub": admin_jwt_subject,
+        "jti": jti,
+        "admin_id": admin.id,
+        "username": admin.username,
+        "exp": expires_at.timestamp(),
+    })
+
+
+def decode_admin_token(token: str) -> Optional[dict]:
+    try:
+        payload = decode_jwt(token)
+    except JWTError:
+        return None
+    if payload.get("sub") != admin_jwt_subject or payload.get("jti") in revoked_tokens:
+        return None
+    return payload
+
+
+async def revoke_admin_tokens(**filters):
+    tokens = dict(await AdminToken.filter(
+        **filters, is_revoked=False, expires_at__gt=datetime.now(pytz.utc)
+    ).values_list("jti", "expires_at"))
+    await AdminToken.filter(jti__in=list(tokens)).update(is_revoked=True)
+    revoked_tokens.update(tokens)
+
+
+async def sync_revoked_tokens():
+    # revocations made by other workers reach this one on the next sync
+    now = datetime.now(pytz.utc)
+    for jti in [jti for jti, expires_at in revoked_tokens.items() if expires_at <= now]:
+        del revoked_tokens[jti]
+    revoked_tokens.update(await AdminToken.filter(
+        is_revoked=True, expires_at__gt=now
+    ).values_list("jti", "expires_at"))
+
+
+async def get_current_admin(
+    bearer: HTTPAuthorizationCredentials = Depends(optional_bearer),
+    basic: HTTPBasicCredentials = Depends(optional_basic),
+):
+    if bearer is not None:
+        payload = decode_admin_token(bearer.credentials)
+        if payload is None:
+            raise HTTPException(
+                status_code=401,
+                detail="Invalid or revoked admin token",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        admin = Admin(id=payload["admin_id"], username=payload["username"])
+        admin.token_id = payload["jti"]
+        return admin
+    if basic is not None:
+        return await authenticate_admin(basic)
+    raise HTTPException(
+        status_code=401,
+        detail="Not authenticated",
+        headers={"WWW-Authenticate": "Basic"},
+    )
+
+
+@job("cleanup_admin_tokens")
+async def cleanup_admin_tokens(payload: dict):
+    await AdminToken.filter(expires_at__lt=datetime.now(pytz.utc)).delete()
@@ -5,7 +5,7 @@ from typing import Annotated
 from app.core.auth.utils.contrib import generate_password_reset_token, verify_password_reset_token, authenticate, decode_google_token
 from app.core.auth.utils.jwt import create_access_token, create_refresh_token, create_access_token_from_refresh_token
 from app.core.auth.schemas import JWTToken, CredentialsSchema, Msg, Token
-from app.core.auth.utils.password import get_password_hash
+from app.core.auth.utils.password import hash_password
 from app.applications.users.utils import update_last_login
 from app.applications.users.models import User
 import google_auth_oauthlib.flow
@@ -167,8 +167,7 @@ async def reset_password(token: str = Body(...), new_password: str = Body(...)):
             status_code=status.HTTP_400_BAD_REQUEST, detail="Inactive user"
         )
 
-    hashed_password = get_password_hash(new_password)
-    user.password_hash = hashed_password
+    user.password_hash = await hash_password(new_password)
     await user.save()
     return {"msg": "Password updated successfully"}
 
@@ -189,9 +188,7 @@ async def register_user(user_in: CredentialsSchema, background_tasks: Background
             detail="A user with this username already exists in the system.",
         )
 
-    hashed_password = get_password_hash(user_in.password)
-    db_user = CredentialsSchema(**user_in.to_dict(), password_hash=hashed_password)
-    created_user = await User.create(db_user)
+    created_user = await User.create(user_in, password_hash=await hash_password(user_in.password))
 
     if created_user:
         if config.EMAILS_ENABLED and user_in.email:
@@ -291,9 +288,9 @@ async def login_google_callback(request: Request):
             "last_name": decoded_info["family_name"],
         }
 
-        hashed_password = get_password_hash(user_dict["password"])
-        db_user = CredentialsSchema(**user_dict, password_hash=hashed_password)
-        created_user = await User.create(db_user)
+        created_user = await User.create(
+            CredentialsSchema(**user_dict), password_hash=await hash_password(user_dict["password"])
+        )
 
     if created_user:
         if config.EMAILS_ENABLED:
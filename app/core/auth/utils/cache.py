@@ -0,0 +1,14 @@
+from app.core.base.cache import TTLCache
+from app.settings import config
+
+token_cache = TTLCache("auth_tokens", config.AUTH_TOKEN_CACHE_SIZE, config.AUTH_TOKEN_CACHE_TTL)
+user_cache = TTLCache("auth_users", config.AUTH_USER_CACHE_SIZE, config.AUTH_USER_CACHE_TTL)
+
+
+def invalidate_user(user_id: int):
+    user_cache.pop(user_id)
+
+
+def invalidate_users(user_ids: list[int]):
+    for user_id in user_ids:
+        user_cache.pop(user_id)
@@ -1,11 +1,14 @@
 from datetime import datetime, timedelta
 from typing import Optional, Annotated
+from copy import copy
+import time
 
 from fastapi import HTTPException, Security, Depends, status
 from fastapi.security import OAuth2PasswordBearer
 from jose.exceptions import JWTError
 from jose import jwt
 
+from app.core.auth.utils.cache import token_cache, user_cache
 from app.core.auth.schemas import CredentialsSchema
 from app.applications.users.models import User
 from app.core.auth.utils import password
@@ -43,17 +46,37 @@ def verify_password_reset_token(token) -> Optional[str]:
         return None
 
 
+def decode_access_token(token: str) -> dict:
+    payload = token_cache.get(token)
+    if payload is None:
+        payload = jwt.decode(token, config.SECRET_KEY, algorithms=[config.JWT_ALGORITHM])
+        expires_in = payload["exp"] - time.time() if "exp" in payload else None
+        token_cache.set(token, payload, ttl=expires_in)
+    return payload
+
+
+async def load_user(user_id: int) -> Optional[User]:
+    user = user_cache.get(user_id)
+    if user is None:
+        user = await User.get_or_none(id=user_id)
+        if user is None or not user.is_active:
+            return user
+        user_cache.set(user_id, user)
+    # requests mutate their user, never hand out the cached instance itself
+    return copy(user)
+
+
 async def get_current_user_optional(token: Optional[str] = Security(oauth2_scheme)):
     if token is None:
         return None
     try:
-        payload = jwt.decode(token, config.SECRET_KEY, algorithms=[config.JWT_ALGORITHM])
+        payload = decode_access_token(token)
         user_id: str = payload.get("user_id")
         if user_id is None:
             return None
     except JWTError:
         return None
-    return await User.get_or_none(id=user_id)
+    return await load_user(user_id)
 
 
 async def get_current_user(user: User = Depends(get_current_user_optional)):
@@ -92,7 +115,7 @@ async def authenticate(credentials: CredentialsSchema) -> Optional[User]:
     if user is None:
         return None
 
-    verified, updated_password_hash = password.verify_and_update_password(
+    verified, updated_password_hash = await password.verify_and_update(
         credentials.password, user.password_hash
     )
 
@@ -1,8 +1,24 @@
+from concurrent.futures import ThreadPoolExecutor
 from passlib.context import CryptContext
-from typing import Tuple
+from typing import Callable, Tuple
+import asyncio
+import time
+
+from app.settings import config
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# bcrypt releases the GIL, a small thread pool keeps hashing off the event loop
+executor = ThreadPoolExecutor(max_workers=config.PASSWORD_HASH_CONCURRENCY, thread_name_prefix="password")
+slots = asyncio.Semaphore(config.PASSWORD_HASH_CONCURRENCY)
+metrics = {
+    "calls": 0,
+    "waiting": 0,
+    "queue_time_total": 0.0,
+    "queue_time_max": 0.0,
+    "run_time_total": 0.0,
+}
+
 
 def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, str]:
     return pwd_context.verify_and_update(plain_password, hashed_password)
@@ -10,3 +26,47 @@ def verify_and_update_password(plain_password: str, hashed_password: str) -> Tup
 
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
+
+
+async def run_in_pool(func: Callable, *args):
+    def timed():
+        started_at = time.perf_counter()
+        return func(*args), started_at, time.perf_counter()
+
+    queued_at = time.perf_counter()
+    metrics["waiting"] += 1
+    try:
+        async with slots:
+            result, started_at, finished_at = await asyncio.get_running_loop().run_in_executor(executor, timed)
+    finally:
+        metrics["waiting"] -= 1
+    queue_time = started_at - queued_at
+    metrics["calls"] += 1
+    metrics["queue_time_total"] += queue_time
+    metrics["queue_time_max"] = max(metrics["queue_time_max"], queue_time)
+    metrics["run_time_total"] += finished_at - started_at
+    return result
+
+
+async def hash_password(password: str) -> str:
+    return await run_in_pool(get_password_hash, password)
+
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return await run_in_pool(pwd_context.verify, plain_password, hashed_password)
+
+
+async def verify_and_update(plain_password: str, hashed_password: str) -> Tuple[bool, str]:
+    return await run_in_pool(verify_and_update_password, plain_password, hashed_password)
+
+
+def password_pool_stats() -> dict:
+    calls = metrics["calls"]
+    return {
+        "concurrency": config.PASSWORD_HASH_CONCURRENCY,
+        "calls": calls,
+        "waiting": metrics["waiting"],
+        "queue_time_avg": metrics["queue_time_total"] / calls if calls else None,
+        "queue_time_max": metrics["queue_time_max"],
+        "run_time_avg": metrics["run_time_total"] / calls if calls else None,
+    }
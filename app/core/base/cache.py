@@ -0,0 +1,62 @@
+from collections import OrderedDict
+from typing import Any, Hashable
+import time
+
+caches: dict[str, "TTLCache"] = {}
+
+
+class TTLCache:
+    """
+    Bounded in-process LRU cache whose entries expire after ttl seconds.
+    Every instance is registered by name so its hit rate can be inspected.
+    """
+
+    def __init__(self, name: str, maxsize: int, ttl: float):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        caches[name] = self
+
+    def get(self, key: Hashable, default=None):
+        entry = self.data.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self.data[key]
+            self.misses += 1
+            return default
+        self.data.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: Hashable, value, ttl: float | None = None):
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return
+        self.data[key] = (time.monotonic() + ttl, value)
+        self.data.move_to_end(key)
+        while len(self.data) > self.maxsize:
+            self.data.popitem(last=False)
+
+    def pop(self, key: Hashable):
+        entry = self.data.pop(key, None)
+        return None if entry is None else entry[1]
+
+    def clear(self):
+        self.data.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else None,
+        }
+
+
+def cache_stats() -> dict:
+    return {name: cache.stats() for name, cache in caches.items()}
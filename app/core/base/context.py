@@ -0,0 +1,97 @@
+from typing import Awaitable, Callable, Hashable, Optional
+from contextvars import ContextVar
+from tortoise import Model
+import asyncio
+
+from app.core.base.dataloader import DataLoader
+from app.core.base.tasks import run_in_background
+
+
+class RequestContext:
+    """
+    Unit of work of one request: a batching loader per model and the results of
+    permission checks, so repeated lookups during serialization hit memory.
+    """
+
+    def __init__(self):
+        self.loaders: dict[type[Model], DataLoader] = {}
+        self.memo: dict[Hashable, asyncio.Task] = {}
+        # sparse fieldset of the request, None returns every field
+        self.fields: Optional[set[str]] = None
+        self.expand: set[str] = set()
+        self.is_open = True
+
+    def close(self):
+        # tasks spawned by the request keep a reference, they must not read stale answers
+        self.is_open = False
+        self.loaders.clear()
+        self.memo.clear()
+
+
+request_context: ContextVar[Optional[RequestContext]] = ContextVar("request_context", default=None)
+
+
+def current_context() -> Optional[RequestContext]:
+    context = request_context.get()
+    return context if context is not None and context.is_open else None
+
+
+def loader(model: type[Model]) -> DataLoader:
+    """
+    Loader of the model shared by the current request, a throwaway one outside of requests
+    """
+    context = current_context()
+    if context is None:
+        return DataLoader(model)
+    if model not in context.loaders:
+        context.loaders[model] = DataLoader(model)
+    return context.loaders[model]
+
+
+async def load(model: type[Model], pk) -> Optional[Model]:
+    return await loader(model).load(pk)
+
+
+def remember(*instances: Model):
+    context = current_context()
+    if context is not None:
+        for instance in instances:
+            loader(type(instance)).prime(instance)
+
+
+async def memoize(key: Hashable, compute: Callable[[], Awaitable]):
+    context = current_context()
+    if context is None:
+        return await compute()
+    # the pending task is stored so that concurrent items of a page share one computation
+    task = context.memo.get(key)
+    if task is None:
+        task = context.memo[key] = run_in_background(compute())
+    try:
+        return await asyncio.shield(task)
+    except Exception:
+        if context.memo.get(key) is task:
+            context.memo.pop(key)
+        raise
+
+
+def forget(key: Hashable):
+    context = current_context()
+    if context is not None:
+        context.memo.pop(key, None)
+
+
+class RequestContextMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        context = RequestContext()
+        token = request_context.set(context)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            context.close()
+            request_context.reset(token)
@@ -0,0 +1,64 @@
+from typing import Any, Hashable, Iterable, Optional
+from tortoise import Model
+import asyncio
+
+from app.core.base.tasks import run_in_background
+
+
+class DataLoader:
+    """
+    Collects the keys requested during one event-loop tick and fetches them with a
+    single id__in query. Results stay cached for the lifetime of the loader.
+    """
+
+    def __init__(self, model: type[Model]):
+        self.model = model
+        self.cache: dict[Hashable, asyncio.Future] = {}
+        self.queue: dict[Hashable, asyncio.Future] = {}
+
+    def load(self, key: Hashable) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        if key in self.cache:
+            return self.cache[key]
+        future = loop.create_future()
+        self.cache[key] = future
+        if key is None:
+            future.set_result(None)
+            return future
+        self.queue[key] = future
+        if len(self.queue) == 1:
+            loop.call_soon(self.dispatch)
+        return future
+
+    async def load_many(self, keys: Iterable[Hashable]) -> list[Optional[Model]]:
+        return list(await asyncio.gather(*(self.load(key) for key in keys)))
+
+    def prime(self, instance: Model):
+        future = self.cache.get(instance.pk)
+        if future is not None and future.done():
+            return
+        if future is None:
+            future = self.cache[instance.pk] = asyncio.get_running_loop().create_future()
+        future.set_result(instance)
+        self.queue.pop(instance.pk, None)
+
+    def dispatch(self):
+        batch, self.queue = self.queue, {}
+        if batch:
+            run_in_background(self.resolve(batch))
+
+    async def resolve(self, batch: dict[Hashable, asyncio.Future]):
+        try:
+            instances: dict[Any, Model] = {
+                instance.pk: instance for instance in await self.model.filter(pk__in=list(batch))
+            }
+        except Exception as error:
+            for key, future in batch.items():
+                # a failed batch must not poison the cache for later requests of the same keys
+                self.cache.pop(key, None)
+                if not future.done():
+                    future.set_exception(error)
+            return
+        for key, future in batch.items():
+            if not future.done():
+                future.set_result(instances.get(key))
@@ -0,0 +1,14 @@
+from tortoise import Tortoise
+
+# statements tortoise cannot express in model Meta, applied after schemas are generated
+raw_schema: list[str] = []
+
+
+def register_schema(statement: str):
+    raw_schema.append(statement)
+
+
+async def apply_raw_schema():
+    connection = Tortoise.get_connection("default")
+    for statement in raw_schema:
+        await connection.execute_script(statement)
@@ -3,8 +3,14 @@ import boto3
 import uuid
 import re
 
+from app.core.base.cache import TTLCache
 from app.settings import config
 
+# urls are signed again once they get close to expiring
+signed_urls = TTLCache(
+    "signed_urls", config.S3_SIGNED_URL_CACHE_SIZE, config.S3_URL_EXPIRES_SECONDS - config.S3_URL_RESIGN_MARGIN_SECONDS
+)
+
 
 class S3:
     client: None
@@ -37,13 +43,17 @@ class S3:
         def convert_cdn(url: str):
             return re.sub(r'(\w+)\.(\w+)\.digitaloceanspaces\.com', r'\1.\2.cdn.digitaloceanspaces.com', url)
 
-        return convert_cdn(
-            S3.client.generate_presigned_url(
-                'get_object',
-                Params={'Bucket': config.S3_BUCKET_NAME, 'Key': filename},
-                ExpiresIn=10800  # 3 hour
+        url = signed_urls.get(filename)
+        if url is None:
+            url = convert_cdn(
+                S3.client.generate_presigned_url(
+                    'get_object',
+                    Params={'Bucket': config.S3_BUCKET_NAME, 'Key': filename},
+                    ExpiresIn=config.S3_URL_EXPIRES_SECONDS
+                )
             )
-        )
+            signed_urls.set(filename, url)
+        return url
 
     @staticmethod
     def upload_file_to_space(response: dict, file):
@@ -4,12 +4,15 @@ from typing import Optional, Type
 from enum import Enum
 
 from app.applications.users.models import User
+from .ranking import rankers, recommend
+from .responses import FastJSONResponse
 from .schemas import BaseOutSchema
 
 
 class PageType(Enum):
     normal = "normal"
     random = "random"
+    recommended = "recommended"
 
 
 class Paginator:
@@ -28,22 +31,30 @@ class Paginator:
         queryset: tuple[QuerySet, list],
         Serializer: Type[BaseOutSchema],
         current_user: Optional[User] = None,
-    ) -> dict:
+    ) -> FastJSONResponse:
         if self.page < 1:
             raise HTTPException(status_code=400, detail="Invalid page number")
         annotations = queryset[1]
         queryset = queryset[0]
 
-        total = await queryset.count()
         offset = (self.page - 1) * self.page_size
-
-        page_data = [
-            await Serializer.serialize(item=item, user=current_user, annotations=annotations)
-            for item in await queryset.limit(self.page_size).offset(offset)
-        ]
-
-        return {
+        if self.page_mode == PageType.recommended:
+            if queryset.model.__name__ not in rankers:
+                raise HTTPException(status_code=400, detail="Recommended mode is not supported for this list")
+            ranked = await recommend(queryset, current_user)
+            total = len(ranked)
+            page_ids = ranked[offset:offset + self.page_size]
+            items = {item.id: item for item in await queryset.filter(id__in=page_ids)}
+            page = [items[item_id] for item_id in page_ids if item_id in items]
+        else:
+            total = await queryset.count()
+            page = await queryset.limit(self.page_size).offset(offset)
+
+        page_data = await Serializer.serialize_page(page, current_user, annotations)
+
+        # serialized pages are plain data, they go straight to orjson
+        return FastJSONResponse({
             "has_next": offset + self.page_size < total,
             "count": total,
             "results": page_data,
-        }
+        })
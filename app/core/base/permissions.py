@@ -0,0 +1,75 @@
+from typing import Optional
+from tortoise import Tortoise
+
+from app.core.base.cache import TTLCache
+from app.settings import config
+
+roles_cache = TTLCache("viewer_roles", maxsize=config.VIEWER_ROLES_CACHE_SIZE, ttl=config.VIEWER_ROLES_CACHE_TTL)
+
+ROLES_SQL = '''
+SELECT 'club' AS "kind", "club_id" AS "id", "is_admin" AS "flag" FROM "memberships" WHERE "user_id" = $1
+UNION ALL
+SELECT 'place', "place_id", true FROM "ownerships" WHERE "user_id" = $1
+UNION ALL
+SELECT 'attendance', "event_id", "is_verified" FROM "attendees" WHERE "user_id" = $1
+UNION ALL
+SELECT 'hosted', "id", true FROM "events" WHERE "host_user_id" = $1
+'''
+
+
+class Roles:
+    """
+    Everything a viewer is to clubs, places and events, so that the allowed actions
+    of a whole page are answered in memory. Only used for display, routes enforce
+    permissions with the model methods.
+    """
+
+    def __init__(self, rows: list[dict]):
+        self.clubs: dict[int, bool] = {}
+        self.places: set[int] = set()
+        self.attendances: dict[int, bool] = {}
+        self.hosted_events: set[int] = set()
+        for row in rows:
+            if row["kind"] == "club":
+                self.clubs[row["id"]] = row["flag"]
+            elif row["kind"] == "place":
+                self.places.add(row["id"])
+            elif row["kind"] == "attendance":
+                self.attendances[row["id"]] = row["flag"]
+            else:
+                self.hosted_events.add(row["id"])
+
+    def membership(self, club_id: int) -> Optional[bool]:
+        return self.clubs.get(club_id)
+
+    def is_admin(self, club_id: Optional[int]) -> bool:
+        return bool(self.clubs.get(club_id))
+
+    def owns(self, place_id: int) -> bool:
+        return place_id in self.places
+
+    def attendance(self, event_id: int) -> Optional[bool]:
+        return self.attendances.get(event_id)
+
+    def hosts(self, event) -> bool:
+        if event.host_club_id:
+            return self.is_admin(event.host_club_id)
+        return event.id in self.hosted_events
+
+
+NO_ROLES = Roles([])
+
+
+async def viewer_roles(user) -> Roles:
+    if user is None:
+        return NO_ROLES
+    roles = roles_cache.get(user.id)
+    if roles is None:
+        roles = Roles(await Tortoise.get_connection("default").execute_query_dict(ROLES_SQL, [user.id]))
+        roles_cache.set(user.id, roles)
+    return roles
+
+
+def invalidate_roles(*user_ids: int):
+    for user_id in user_ids:
+        roles_cache.pop(user_id)
@@ -0,0 +1,110 @@
+from typing import Awaitable, Callable, Optional
+import numpy as np
+import hashlib
+import time
+
+from app.core.base.cache import TTLCache
+from app.settings import config
+
+Ranker = Callable[..., Awaitable[tuple[np.ndarray, dict[str, np.ndarray]]]]
+
+rankers: dict[str, Ranker] = {}
+candidate_windows = TTLCache(
+    "ranking_windows", maxsize=config.RANKING_WINDOW_CACHE_SIZE, ttl=config.RANKING_WINDOW_TTL_SECONDS
+)
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def ranker(model_name: str):
+    """
+    Registers the feature extractor of a model, it receives a bounded candidate
+    queryset and the viewer and returns the candidate ids with one array per feature
+    """
+    def register(func: Ranker):
+        rankers[model_name] = func
+        return func
+    return register
+
+
+def column(rows: list[dict], key: str, default: float = np.nan) -> np.ndarray:
+    return np.fromiter(
+        (default if row[key] is None else float(row[key]) for row in rows), dtype=np.float64, count=len(rows)
+    )
+
+
+def timestamps(rows: list[dict], key: str) -> np.ndarray:
+    return np.fromiter(
+        (np.nan if row[key] is None else row[key].timestamp() for row in rows), dtype=np.float64, count=len(rows)
+    )
+
+
+def lookup(ids: np.ndarray, values: dict[int, float]) -> np.ndarray:
+    return np.fromiter((values.get(int(item_id), 0.0) for item_id in ids), dtype=np.float64, count=len(ids))
+
+
+def membership(keys: np.ndarray, members: set[int]) -> np.ndarray:
+    if not members:
+        return np.zeros(len(keys))
+    return np.isin(keys, np.fromiter(members, dtype=np.float64)).astype(np.float64)
+
+
+def recency(created: np.ndarray, half_life_hours: float, now: Optional[float] = None) -> np.ndarray:
+    now = time.time() if now is None else now
+    age_hours = np.clip((now - created) / 3600, 0, None)
+    return np.nan_to_num(np.exp2(-age_hours / half_life_hours))
+
+
+def proximity(latitude: np.ndarray, longitude: np.ndarray, viewer_latitude, viewer_longitude,
+              scale_km: float) -> np.ndarray:
+    """
+    1 at the viewer's location decaying with haversine distance, 0 when either location is unknown
+    """
+    if viewer_latitude is None or viewer_longitude is None:
+        return np.zeros(len(latitude))
+    lat1, lon1 = np.radians(float(viewer_latitude)), np.radians(float(viewer_longitude))
+    lat2, lon2 = np.radians(latitude), np.radians(longitude)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    distance = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+    return np.nan_to_num(1 / (1 + distance / scale_km))
+
+
+def saturate(values: np.ndarray) -> np.ndarray:
+    return np.log1p(np.nan_to_num(np.clip(values, 0, None)))
+
+
+def score(features: dict[str, np.ndarray], weights: dict[str, float]) -> np.ndarray:
+    total = np.zeros(len(next(iter(features.values()))) if features else 0)
+    for name, weight in weights.items():
+        if name in features:
+            total += weight * features[name]
+    return total
+
+
+def top_k(ids: np.ndarray, scores: np.ndarray, k: int) -> np.ndarray:
+    if k < len(ids):
+        best = np.argpartition(-scores, k - 1)[:k]
+    else:
+        best = np.arange(len(ids))
+    order = np.lexsort((-ids[best], -scores[best]))
+    return ids[best][order]
+
+
+async def recommend(queryset, user) -> list[int]:
+    """
+    Ids of the queryset ordered by relevance to the user, computed over the most
+    recent candidates and kept for a while so that later pages read the same window
+    """
+    model_name = queryset.model.__name__
+    key = (
+        user.id if user else None, model_name,
+        hashlib.sha1(queryset.sql().encode()).hexdigest()
+    )
+    window = candidate_windows.get(key)
+    if window is None:
+        candidates = queryset.order_by("-id").limit(config.RANKING_CANDIDATES)
+        ids, features = await rankers[model_name](candidates, user)
+        window = top_k(ids, score(features, config.RANKING_WEIGHTS[model_name]), config.RANKING_WINDOW_SIZE)
+        window = window.astype(np.int64).tolist()
+        candidate_windows.set(key, window)
+    return window
@@ -0,0 +1,29 @@
+from typing import Awaitable, Callable
+import hashlib
+import json
+import time
+
+
+class ReferenceData:
+    """
+    Keeps a rarely changing table serialized in memory, stamped with a version
+    derived from its content so that every worker reports the same version.
+    """
+
+    def __init__(self, loader: Callable[[], Awaitable[list[dict]]], ttl: float):
+        self.loader = loader
+        self.ttl = ttl
+        self.items: list[dict] | None = None
+        self.version: str | None = None
+        self.expires_at = 0.0
+
+    async def get(self) -> tuple[list[dict], str]:
+        if self.items is None or self.expires_at < time.monotonic():
+            items = await self.loader()
+            self.version = hashlib.sha256(json.dumps(items, default=str, sort_keys=True).encode()).hexdigest()[:16]
+            self.items = items
+            self.expires_at = time.monotonic() + self.ttl
+        return self.items, self.version
+
+    def invalidate(self):
+        self.items = None
@@ -0,0 +1,66 @@
+from fastapi.responses import ORJSONResponse, Response
+from pydantic import BaseModel
+from decimal import Decimal
+from tortoise import Model
+from typing import Any, Optional
+import orjson
+
+OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def encode_default(value: Any):
+    """
+    Types orjson does not know, datetimes, dates, enums and uuids are encoded natively
+    """
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, Model):
+        return {name: getattr(value, name) for name in value._meta.fields_db_projection}
+    if isinstance(value, BaseModel):
+        return value.dict()
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=encode_default, option=OPTIONS)
+
+
+class FastJSONResponse(ORJSONResponse):
+    """
+    Default response of the app. Handlers returning it directly also skip the
+    jsonable_encoder pass FastAPI runs over returned values.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def etag_matches(if_none_match: Optional[str], version: str) -> bool:
+    """
+    Weak comparison against an If-None-Match header, a comma separated list of
+    optionally W/ prefixed entity tags or *
+    """
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*":
+            return True
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag.strip('"') == version:
+            return True
+    return False
+
+
+def not_modified(if_none_match: Optional[str], version: str, response: Optional[Response] = None) -> Optional[Response]:
+    """
+    Returns a 304 when the client holds the version, otherwise tags the response with it
+    """
+    if etag_matches(if_none_match, version):
+        return Response(status_code=304, headers={"ETag": f'"{version}"'})
+    if response is not None:
+        response.headers["ETag"] = f'"{version}"'
+    return None
@@ -1,17 +1,124 @@
 from tortoise.contrib.pydantic.base import PydanticModel
+from typing import Awaitable, Callable, Optional
+from fastapi import Query
+import asyncio
+import time
+
+from .context import current_context
+
+field_costs: dict[str, dict] = {}
+
+
+def field_group(name: str):
+    """
+    Marks a method of an out schema as the computed group name, it receives the item
+    and the viewer and returns the fields of the group. Groups are skipped unless selected.
+    """
+    def register(func: Callable[..., Awaitable[dict]]):
+        func.field_group = name
+        return classmethod(func)
+    return register
+
+
+def split_fields(value: Optional[str]) -> set[str]:
+    return {field.strip() for field in value.split(",") if field.strip()} if value else set()
+
+
+async def select_fields(
+    fields: Optional[str] = Query(None, description="Comma separated fields and computed groups to return"),
+    expand: Optional[str] = Query(None, description="Comma separated computed groups to add to fields"),
+):
+    context = current_context()
+    if context is not None:
+        context.fields = None if fields is None else split_fields(fields)
+        context.expand = split_fields(expand)
+
+
+def record_cost(key: str, elapsed: float):
+    # one call is a group computed for a page, or for a single serialized item
+    cost = field_costs.get(key)
+    if cost is None:
+        cost = field_costs[key] = {"calls": 0, "time_total": 0.0, "time_max": 0.0}
+    cost["calls"] += 1
+    cost["time_total"] += elapsed
+    cost["time_max"] = max(cost["time_max"], elapsed)
+
+
+def field_cost_stats() -> dict:
+    return {
+        key: {**cost, "time_avg": cost["time_total"] / cost["calls"]}
+        for key, cost in sorted(field_costs.items(), key=lambda entry: -entry[1]["time_total"])
+    }
 
 
 class BaseOutSchema:
     pydantic_model = PydanticModel
+    field_groups: dict[str, Callable[..., Awaitable[dict]]] = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.field_groups = dict(cls.field_groups)
+        for attribute in vars(cls).values():
+            func = getattr(attribute, "__func__", None)
+            if hasattr(func, "field_group"):
+                cls.field_groups[func.field_group] = func
+
+    @classmethod
+    def selected_groups(cls) -> list[str]:
+        context = current_context()
+        if context is None or context.fields is None:
+            return list(cls.field_groups)
+        return [group for group in cls.field_groups if group in context.fields or group in context.expand]
+
+    @classmethod
+    def wants(cls, group: str) -> bool:
+        return group in cls.selected_groups()
 
     @classmethod
     async def serialize(cls, item, user, annotations=[]) -> dict:
-        data = (await cls.pydantic_model.from_tortoise_orm(item)).dict()
+        data = await cls.model_fields(item)
         data.update(await cls.add_fields(item, user))
         for annotation in annotations:
             data[annotation] = getattr(item, annotation, None)
         return data
 
+    @classmethod
+    async def serialize_page(cls, items, user, annotations=[]) -> list[dict]:
+        await cls.prefetch(items, user)
+        page = list(await asyncio.gather(*(cls.model_fields(item) for item in items)))
+        for group in cls.selected_groups():
+            # items are serialized concurrently so that their loader lookups land in the same batch,
+            # a group is timed once for the whole page since the per item calls overlap
+            began = time.perf_counter()
+            values = await asyncio.gather(*(cls.field_groups[group](cls, item, user) for item in items))
+            record_cost(f"{cls.__name__}.{group}", time.perf_counter() - began)
+            for data, value in zip(page, values):
+                data.update(value)
+        for data, item in zip(page, items):
+            for annotation in annotations:
+                data[annotation] = getattr(item, annotation, None)
+        return page
+
+    @classmethod
+    async def model_fields(cls, item) -> dict:
+        data = (await cls.pydantic_model.from_tortoise_orm(item)).dict()
+        context = current_context()
+        if context is not None and context.fields is not None:
+            data = {key: value for key, value in data.items() if key == "id" or key in context.fields}
+        return data
+
+    @classmethod
+    async def prefetch(cls, items, user) -> None:
+        """
+        Loads data for a whole page at once and attaches it to the items for add_fields
+        """
+        pass
+
     @classmethod
     async def add_fields(cls, item, user) -> dict:
-        return dict()
+        data = {}
+        for group in cls.selected_groups():
+            began = time.perf_counter()
+            data.update(await cls.field_groups[group](cls, item, user))
+            record_cost(f"{cls.__name__}.{group}", time.perf_counter() - began)
+        return data
@@ -1,17 +1,25 @@
-from datetime import datetime
-from typing import Callable
+from typing import Awaitable, Callable, Coroutine
+import logging
 import asyncio
 
+logger = logging.getLogger(__name__)
 
-def run_async_task(func: Callable, *args, **kwargs):
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    loop.run_until_complete(func(*args, **kwargs))
+running_tasks: set[asyncio.Task] = set()
 
 
-def schedule_task(func: Callable, time: datetime, *args, **kwargs):
-    if datetime.now() == time:
-        func(*args, **kwargs)
-# TODO: cant use celery as it is not recommended for far future
-# cant use apschedule as it is not recommended for far future
-# implement a manual cronjob for this if possible use BackgroundTask
+def run_in_background(coro: Coroutine) -> asyncio.Task:
+    # the loop only keeps weak references to tasks, hold them until they finish
+    task = asyncio.create_task(coro)
+    running_tasks.add(task)
+    task.add_done_callback(running_tasks.discard)
+    return task
+
+
+async def run_periodically(func: Callable[[], Awaitable], seconds: float, start_after: float = 0):
+    await asyncio.sleep(start_after)
+    while True:
+        try:
+            await func()
+        except Exception:
+            logger.exception("Periodic task %s failed", func.__name__)
+        await asyncio.sleep(seconds)
@@ -0,0 +1,101 @@
+from tortoise.exceptions import OperationalError
+from asyncpg.exceptions import DataError
+from typing import Any, Callable, Optional
+from tortoise import Tortoise, Model
+import logging
+
+from app.core.base.tasks import run_in_background
+
+logger = logging.getLogger(__name__)
+
+MAX_ROWS_PER_STATEMENT = 1000
+
+
+def is_data_error(error: Exception) -> bool:
+    # the asyncpg client of tortoise re-raises driver errors as OperationalError
+    return isinstance(error, OperationalError) and isinstance(error.__cause__ or error.__context__, DataError)
+
+
+class WriteBehindBuffer:
+    """
+    Coalesces column updates per primary key in memory and writes them with one
+    UPDATE ... FROM (VALUES ...) per set of changed columns.
+    """
+
+    def __init__(
+        self,
+        model: type[Model],
+        column_types: dict[str, str],
+        max_entries: int,
+        after_flush: Optional[Callable[[list], None]] = None,
+    ):
+        self.model = model
+        self.column_types = column_types
+        self.max_entries = max_entries
+        self.after_flush = after_flush
+        self.pending: dict[Any, dict[str, Any]] = {}
+
+    def record(self, pk, **values):
+        self.pending.setdefault(pk, {}).update(values)
+        if len(self.pending) >= self.max_entries:
+            run_in_background(self.flush())
+
+    async def flush(self):
+        if not self.pending:
+            return
+        pending, self.pending = self.pending, {}
+        groups: dict[tuple[str, ...], list] = {}
+        for pk, values in pending.items():
+            groups.setdefault(tuple(sorted(values)), []).append(pk)
+        try:
+            for columns, pks in groups.items():
+                for i in range(0, len(pks), MAX_ROWS_PER_STATEMENT):
+                    await self.write_chunk(columns, [(pk, pending[pk]) for pk in pks[i:i + MAX_ROWS_PER_STATEMENT]])
+        except Exception:
+            # keep values that were not superseded meanwhile for the next flush
+            for pk, values in pending.items():
+                self.pending[pk] = {**values, **self.pending.get(pk, {})}
+            raise
+        if self.after_flush:
+            self.after_flush(list(pending))
+
+    async def write_chunk(self, columns: tuple[str, ...], rows: list[tuple[Any, dict]]):
+        """
+        A value the columns can not hold fails the whole statement, the chunk is then
+        written row by row and the offending rows are dropped instead of retried forever
+        """
+        try:
+            await self.write(columns, rows)
+        except OperationalError as error:
+            if not is_data_error(error):
+                raise
+            for row in rows:
+                try:
+                    await self.write(columns, [row])
+                except OperationalError as error:
+                    if not is_data_error(error):
+                        raise
+                    logger.exception("Dropped buffered %s update of %s", self.model.__name__, row[0])
+
+    async def write(self, columns: tuple[str, ...], rows: list[tuple[Any, dict]]):
+        meta = self.model._meta
+        pk_column = meta.db_pk_column
+        width = len(columns) + 1
+        placeholders = []
+        params = []
+        for index, (pk, values) in enumerate(rows):
+            start = index * width
+            casts = [f"${start + 1}::bigint"] + [
+                f"${start + 2 + offset}::{self.column_types[column]}" for offset, column in enumerate(columns)
+            ]
+            placeholders.append(f"({', '.join(casts)})")
+            params.append(pk)
+            params.extend(values[column] for column in columns)
+        assignments = ", ".join(f'"{column}" = v."{column}"' for column in columns)
+        names = ", ".join(f'"{column}"' for column in (pk_column, ) + columns)
+        await Tortoise.get_connection("default").execute_query(
+            f'UPDATE "{meta.db_table}" AS t SET {assignments} '
+            f'FROM (VALUES {", ".join(placeholders)}) AS v({names}) '
+            f'WHERE t."{pk_column}" = v."{pk_column}"',
+            params,
+        )
@@ -2,6 +2,7 @@ from tortoise import fields
 from enum import Enum
 
 from app.core.base.models import BaseDBModel, BaseCreatedAtModel
+from app.core.base.db import register_schema
 from app.applications.users.models import User
 
 
@@ -14,6 +15,7 @@ class DeviceType(str, Enum):
 class FCMDevice(BaseDBModel, BaseCreatedAtModel):
     class Meta:
         table = "devices"
+        unique_together = (("user", "device_id"), )
     name = fields.CharField(max_length=255, blank=True, null=True)
     device_id = fields.CharField(blank=True, null=True, db_index=True, max_length=255)
     registration_id = fields.TextField()
@@ -22,3 +24,18 @@ class FCMDevice(BaseDBModel, BaseCreatedAtModel):
     user: fields.ForeignKeyRelation[User] = fields.ForeignKeyField(
         "models.User", related_name="devices", on_delete=fields.base.CASCADE
     )
+
+
+# token rotation used to add a row per registration, keep the newest device row of each user and device id
+register_schema('''
+DO $$ BEGIN
+IF NOT EXISTS (
+    SELECT 1 FROM pg_indexes WHERE tablename = 'devices' AND indexdef LIKE 'CREATE UNIQUE INDEX % (user_id, device_id)'
+) THEN
+    DELETE FROM "devices" AS "duplicate" USING "devices" AS "kept"
+    WHERE "duplicate"."user_id" = "kept"."user_id" AND "duplicate"."device_id" IS NOT DISTINCT FROM "kept"."device_id"
+        AND "duplicate"."id" < "kept"."id";
+    CREATE UNIQUE INDEX "uidx_devices_user_device" ON "devices" ("user_id", "device_id");
+END IF;
+END $$;
+''')
@@ -14,13 +14,16 @@ async def get_or_register_device(
     current_user: User = Depends(get_current_active_user),
 ):
     """
-    Gets device if it already exists otherwise it creates this device
+    Registers the device of the user, rotated tokens update the existing device
     """
-    device, created = await FCMDevice.get_or_create(
-        name=device_in.name,
+    device, created = await FCMDevice.update_or_create(
+        defaults={
+            "name": device_in.name,
+            "registration_id": device_in.registration_id,
+            "device_type": device_in.device_type,
+        },
         user=current_user,
         device_id=device_in.device_id,
-        registration_id=device_in.registration_id,
-        device_type=device_in.device_type
     )
+    await FCMDevice.filter(registration_id=device_in.registration_id).exclude(id=device.id).delete()
     return RegisterDeviceOut(device=device.device_id, created=created)
@@ -1,29 +1,32 @@
+from firebase_admin import messaging, exceptions
 from tortoise.queryset import QuerySet
-from firebase_admin import messaging
 from tortoise.expressions import F
 from copy import copy
+import asyncio
 
+from app.core.auth.utils.cache import invalidate_users
 from app.applications.users.models import User
 from app.main import firebase_app
 from .models import FCMDevice
 
 MAX_BATCH_SIZE = 500  # This is firebase cloud messaging limit
+STALE_TOKEN_ERRORS = (messaging.UnregisteredError, messaging.SenderIdMismatchError)
 
 
-async def send_notification(users: QuerySet, title, body, image):
-    def prepare_message(message: messaging.Message, token):
-        message.token = token
-        return copy(message)
-    user_ids = await users.values_list("id", flat=True)
-    await User.filter(id__in=user_ids).update(unread_notifications=F('unread_notifications') + 1)
-    registration_ids = await FCMDevice.filter(user_id__in=user_ids).values_list("registration_id", flat=True)
-    message = messaging.Message(
+def build_message(title, body, image) -> messaging.Message:
+    return messaging.Message(
         notification=messaging.Notification(
             title=title,
             body=body,
             image=image,
         )
     )
+
+
+def send_batch(message: messaging.Message, registration_ids: list[str]) -> list[messaging.SendResponse]:
+    def prepare_message(message: messaging.Message, token):
+        message.token = token
+        return copy(message)
     responses: list[messaging.SendResponse] = []
     for i in range(0, len(registration_ids), MAX_BATCH_SIZE):
         messages = [
@@ -35,4 +38,41 @@ async def send_notification(users: QuerySet, title, body, image):
                 messages, app=firebase_app
             ).responses
         )
+    return responses
+
+
+def stale_registration_ids(registration_ids: list[str], responses: list[messaging.SendResponse]) -> list[str]:
+    failed = [
+        (token, response.exception)
+        for token, response in zip(registration_ids, responses)
+        if not response.success
+    ]
+    # when every token of a send is rejected as invalid the message itself is broken, not the tokens
+    invalid = [token for token, error in failed if isinstance(error, exceptions.InvalidArgumentError)]
+    if len(invalid) == len(registration_ids):
+        invalid = []
+    return [token for token, error in failed if isinstance(error, STALE_TOKEN_ERRORS)] + invalid
+
+
+async def prune_registration_ids(registration_ids: list[str], responses: list[messaging.SendResponse]) -> int:
+    stale = stale_registration_ids(registration_ids, responses)
+    if not stale:
+        return 0
+    return await FCMDevice.filter(registration_id__in=stale).delete()
+
+
+async def push(message: messaging.Message, registration_ids: list[str]) -> list[messaging.SendResponse]:
+    if not registration_ids:
+        return []
+    responses = await asyncio.to_thread(send_batch, message, registration_ids)
+    await prune_registration_ids(registration_ids, responses)
+    return responses
+
+
+async def send_notification(users: QuerySet, title, body, image):
+    user_ids = await users.values_list("id", flat=True)
+    await User.filter(id__in=user_ids).update(unread_notifications=F('unread_notifications') + 1)
+    invalidate_users(user_ids)
+    registration_ids = await FCMDevice.filter(user_id__in=user_ids).values_list("registration_id", flat=True)
+    responses = await push(build_message(title, body, image), registration_ids)
     return messaging.BatchResponse(responses)
@@ -1,13 +1,34 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException, Request, Header
+from fastapi.responses import Response
+from typing import Optional
 
-from app.core.base.utils import get_object_or_404
-from .models import Language, SupportedLanguages
-from .schemas import LanguageSchema
+from app.core.base.responses import not_modified
+from .models import SupportedLanguages
+from .utils import language_packs
 
 router = APIRouter()
 
 
-@router.get("/{lang}/", response_model=LanguageSchema, status_code=200, tags=['base'])
-async def get_language(lang: SupportedLanguages):
-    lang = await get_object_or_404(Language, lang=lang)
-    return LanguageSchema(data=lang.data)
+@router.get("/{lang}/", status_code=200, tags=['base'])
+async def get_language(
+    lang: SupportedLanguages,
+    request: Request,
+    version: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+):
+    """
+    Returns the language pack, nothing when the given version is current or a key-level delta from an older version
+    """
+    pack = language_packs.get(lang)
+    if pack is None:
+        raise HTTPException(status_code=404, detail="Object not found!")
+    cached = not_modified(if_none_match, pack.version)
+    if cached is not None:
+        return cached
+    if version == pack.version:
+        return Response(status_code=204)
+    if version is not None:
+        old = language_packs.previous(lang, version)
+        if old is not None:
+            return pack.delta(old)
+    return pack.response(request.headers.get("accept-encoding", ""))
@@ -0,0 +1,83 @@
+from fastapi.responses import Response
+from typing import Optional
+import hashlib
+import brotli
+import gzip
+import json
+
+from .models import Language, SupportedLanguages
+from app.settings import config
+
+MISSING = object()
+
+
+def encode(payload: dict) -> bytes:
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":"), sort_keys=True).encode()
+
+
+class LanguagePack:
+    def __init__(self, data: dict):
+        self.data = data or {}
+        self.version = hashlib.sha256(encode(self.data)).hexdigest()[:16]
+        body = encode({"version": self.version, "data": self.data})
+        self.bodies = {
+            "br": brotli.compress(body),
+            "gzip": gzip.compress(body),
+            "identity": body,
+        }
+
+    def delta(self, old: "LanguagePack") -> dict:
+        return {
+            "version": self.version,
+            "base_version": old.version,
+            "set": {key: value for key, value in self.data.items() if old.data.get(key, MISSING) != value},
+            "delete": [key for key in old.data if key not in self.data],
+        }
+
+    def response(self, accept_encoding: str) -> Response:
+        accepted = {token.split(";")[0].strip() for token in accept_encoding.split(",")}
+        encoding = next((name for name in ("br", "gzip") if name in accepted), "identity")
+        headers = {"ETag": f'"{self.version}"', "Vary": "Accept-Encoding"}
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return Response(content=self.bodies[encoding], media_type="application/json", headers=headers)
+
+
+class LanguagePackCache:
+    def __init__(self, history_size: int):
+        self.history_size = history_size
+        self.packs: dict[str, LanguagePack] = {}
+        self.history: dict[str, dict[str, LanguagePack]] = {}
+
+    def put(self, lang: str, data: dict):
+        pack = LanguagePack(data)
+        self.packs[lang] = pack
+        history = self.history.setdefault(lang, {})
+        history.pop(pack.version, None)
+        history[pack.version] = pack
+        while len(history) > self.history_size:
+            history.pop(next(iter(history)))
+
+    def get(self, lang: str) -> Optional[LanguagePack]:
+        return self.packs.get(lang)
+
+    def previous(self, lang: str, version: str) -> Optional[LanguagePack]:
+        return self.history.get(lang, {}).get(version)
+
+    def remove(self, lang: str):
+        self.packs.pop(lang, None)
+        self.history.pop(lang, None)
+
+    async def load(self):
+        for language in await Language.all().order_by("id"):
+            self.put(language.lang, language.data)
+
+    async def reload(self, lang: SupportedLanguages):
+        language = await Language.filter(lang=lang).order_by("-id").first()
+        if language is None:
+            self.remove(lang)
+        else:
+            self.put(lang, language.data)
+
+
+language_packs = LanguagePackCache(config.LANGUAGE_PACK_HISTORY_SIZE)
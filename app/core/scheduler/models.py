@@ -0,0 +1,31 @@
+from tortoise import fields
+from enum import Enum
+
+from app.core.base.models import BaseDBModel, BaseCreatedAtModel
+from app.core.base.db import register_schema
+
+
+class Job(BaseDBModel, BaseCreatedAtModel):
+    class Status(str, Enum):
+        pending = "pending"
+        running = "running"
+        done = "done"
+        failed = "failed"
+
+    class Meta:
+        table = "jobs"
+    name = fields.CharField(max_length=100)
+    key = fields.CharField(max_length=255, unique=True, null=True)
+    payload = fields.JSONField(null=True)
+    status = fields.CharEnumField(enum_type=Status, max_length=10, default=Status.pending)
+    run_at = fields.DatetimeField()
+    interval = fields.IntField(null=True)
+    attempts = fields.IntField(default=0)
+    max_attempts = fields.IntField(default=5)
+    locked_until = fields.DatetimeField(null=True)
+    last_error = fields.TextField(null=True)
+
+
+register_schema(
+    'CREATE INDEX IF NOT EXISTS "idx_jobs_due" ON "jobs" ("run_at") WHERE "status" IN (\'pending\', \'running\');'
+)
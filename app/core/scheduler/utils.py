@@ -0,0 +1,165 @@
+from tortoise.exceptions import IntegrityError
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable
+from tortoise import Tortoise
+import traceback
+import logging
+import asyncio
+import pytz
+
+from app.settings import config
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+handlers: dict[str, Callable[[dict], Awaitable]] = {}
+
+CLAIM_SQL = '''
+UPDATE "jobs" SET "status" = 'running', "attempts" = "attempts" + 1,
+    "locked_until" = now() + $2 * interval '1 second'
+WHERE "id" IN (
+    SELECT "id" FROM "jobs"
+    WHERE "status" IN ('pending', 'running') AND "run_at" <= now()
+        AND ("status" = 'pending' OR "locked_until" < now())
+    ORDER BY "run_at"
+    LIMIT $1
+    FOR UPDATE SKIP LOCKED
+)
+RETURNING "id"
+'''
+
+
+def job(name: str):
+    def register(handler: Callable[[dict], Awaitable]):
+        handlers[name] = handler
+        return handler
+    return register
+
+
+async def schedule(
+    name: str,
+    run_at: datetime,
+    payload: dict | None = None,
+    key: str | None = None,
+    interval: int | None = None,
+    max_attempts: int = 5,
+) -> None:
+    """
+    Schedules a job, a job with the same key is replaced instead of duplicated
+    """
+    values = {
+        "name": name,
+        "payload": payload,
+        "run_at": run_at,
+        "interval": interval,
+        "max_attempts": max_attempts,
+        "status": Job.Status.pending,
+        "attempts": 0,
+        "locked_until": None,
+        "last_error": None,
+    }
+    if key is None:
+        await Job.create(**values)
+        return
+    if await Job.filter(key=key).update(**values):
+        return
+    try:
+        await Job.create(**values, key=key)
+    except IntegrityError:
+        await Job.filter(key=key).update(**values)
+
+
+async def schedule_recurring(name: str, interval: int, payload: dict | None = None) -> None:
+    if not await Job.filter(key=name).exists():
+        await schedule(name, datetime.now(pytz.utc), payload, key=name, interval=interval)
+
+
+async def cancel(key: str) -> None:
+    await Job.filter(key=key, status=Job.Status.pending).delete()
+
+
+async def claim_jobs() -> list[Job]:
+    rows = await Tortoise.get_connection("default").execute_query_dict(
+        CLAIM_SQL, [config.SCHEDULER_BATCH_SIZE, config.SCHEDULER_LEASE_SECONDS]
+    )
+    if not rows:
+        return []
+    return await Job.filter(id__in=[row["id"] for row in rows]).order_by("run_at")
+
+
+def claimed(job: Job):
+    """
+    The job row while it still is the attempt this worker claimed, a schedule() with the
+    same key or a claim by another worker after an expired lease changes it
+    """
+    return Job.filter(id=job.id, status=Job.Status.running, attempts=job.attempts, run_at=job.run_at)
+
+
+async def keep_lease(job: Job) -> None:
+    # long handlers must not be claimed again by another worker while they are running
+    while True:
+        await asyncio.sleep(config.SCHEDULER_LEASE_SECONDS / 3)
+        await claimed(job).update(
+            locked_until=datetime.now(pytz.utc) + timedelta(seconds=config.SCHEDULER_LEASE_SECONDS)
+        )
+
+
+async def execute(job: Job, slots: asyncio.Semaphore) -> None:
+    async with slots:
+        now = datetime.now(pytz.utc)
+        lease = asyncio.create_task(keep_lease(job))
+        try:
+            handler = handlers[job.name]
+            await handler(job.payload or {})
+        except Exception:
+            logger.exception("Job %s (%s) failed", job.id, job.name)
+            if job.attempts < job.max_attempts:
+                retry_in = config.SCHEDULER_RETRY_BASE_SECONDS * 2 ** (job.attempts - 1)
+                await claimed(job).update(
+                    status=Job.Status.pending,
+                    run_at=now + timedelta(seconds=retry_in),
+                    last_error=traceback.format_exc(),
+                )
+            elif job.interval:
+                await claimed(job).update(
+                    status=Job.Status.pending,
+                    run_at=now + timedelta(seconds=job.interval),
+                    attempts=0,
+                    last_error=traceback.format_exc(),
+                )
+            else:
+                await claimed(job).update(status=Job.Status.failed, last_error=traceback.format_exc())
+            return
+        finally:
+            lease.cancel()
+        # a job rescheduled while it ran keeps its new run
+        if job.interval:
+            await claimed(job).update(
+                status=Job.Status.pending, run_at=now + timedelta(seconds=job.interval), attempts=0, last_error=None
+            )
+        else:
+            await claimed(job).update(status=Job.Status.done, locked_until=None)
+
+
+async def run_scheduler():
+    """
+    Polls due jobs with FOR UPDATE SKIP LOCKED so several workers can share the table.
+    Jobs are delivered at least once: a job whose worker died is claimed again after its lease.
+    """
+    slots = asyncio.Semaphore(config.SCHEDULER_CONCURRENCY)
+    while True:
+        try:
+            jobs = await claim_jobs()
+            await asyncio.gather(*(execute(job, slots) for job in jobs))
+        except Exception:
+            logger.exception("Scheduler poll failed")
+            jobs = []
+        if len(jobs) < config.SCHEDULER_BATCH_SIZE:
+            await asyncio.sleep(config.SCHEDULER_POLL_SECONDS)
+
+
+@job("cleanup_jobs")
+async def cleanup_jobs(payload: dict):
+    await Job.filter(
+        status=Job.Status.done, run_at__lt=datetime.now(pytz.utc) - timedelta(days=config.SCHEDULER_KEEP_DONE_DAYS)
+    ).delete()
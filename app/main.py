@@ -2,10 +2,13 @@ from tortoise.contrib.fastapi import register_tortoise
 from firebase_admin import credentials, initialize_app
 from fastapi.middleware.cors import CORSMiddleware
 from tortoise import Tortoise
-from fastapi import FastAPI
+from fastapi import FastAPI, Depends
 import logging.config
 
 from app.core.base.exceptions import APIException, on_api_exception
+from app.core.base.context import RequestContextMiddleware
+from app.core.base.responses import FastJSONResponse
+from app.core.base.tasks import run_in_background, run_periodically
 from app.settings import config
 
 logging.config.dictConfig(config.DEFAULT_LOGGING)
@@ -13,7 +16,8 @@ logging.config.dictConfig(config.DEFAULT_LOGGING)
 app = FastAPI(
     title=config.APP_TITLE,
     description=config.APP_DESCRIPTION,
-    version=config.VERSION
+    version=config.VERSION,
+    default_response_class=FastJSONResponse,
 )
 
 app.add_middleware(
@@ -24,6 +28,8 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(RequestContextMiddleware)
+
 app.add_exception_handler(APIException, on_api_exception)
 
 tortoise_config = {
@@ -52,34 +58,84 @@ Tortoise.init_models(config.APP_LIST, "models")
 # these imports must be after init models call
 from app.applications.users.routes import university_router, router as users_router
 from app.applications.organisations.routes import club_router, place_router
+from app.core.scheduler.utils import run_scheduler, schedule_recurring
 from app.applications.posts.routes import post_router, comment_router
 from app.applications.interactions.routes import interaction_router
 from app.applications.events.routes import router as events_router
+from app.applications.feed.routes import router as feed_router
+from app.applications.interactions.utils import rebuild_tag_counts
+from app.applications.interactions.models import TagCount
+from app.applications.organisations.utils import rebuild_club_stats
+from app.applications.organisations.models import ClubStats
 from app.core.lang.routes import router as language_router
 from app.core.admin.routes import router as admin_router
 from app.core.auth.routes import router as auth_router
+from app.core.admin.utils import sync_revoked_tokens
+from app.applications.users.utils import user_writes, load_connection_graph
 from app.core.fcm.routes import router as fcm_router
+from app.core.lang.utils import language_packs
+from app.core.base.schemas import select_fields
+from app.core.base.db import apply_raw_schema
 
 app.include_router(admin_router, prefix='/admin')
 app.include_router(language_router, prefix='/api/languages')
-app.include_router(users_router, prefix='/api/users')
-app.include_router(events_router, prefix='/api/events')
-app.include_router(club_router, prefix='/api/clubs')
-app.include_router(place_router, prefix='/api/places')
-app.include_router(post_router, prefix='/api/posts')
-app.include_router(comment_router, prefix='/api/comments')
-app.include_router(interaction_router, prefix='/api')
+app.include_router(users_router, prefix='/api/users', dependencies=[Depends(select_fields)])
+app.include_router(events_router, prefix='/api/events', dependencies=[Depends(select_fields)])
+app.include_router(club_router, prefix='/api/clubs', dependencies=[Depends(select_fields)])
+app.include_router(place_router, prefix='/api/places', dependencies=[Depends(select_fields)])
+app.include_router(post_router, prefix='/api/posts', dependencies=[Depends(select_fields)])
+app.include_router(feed_router, prefix='/api/feed', dependencies=[Depends(select_fields)])
+app.include_router(comment_router, prefix='/api/comments', dependencies=[Depends(select_fields)])
+app.include_router(interaction_router, prefix='/api', dependencies=[Depends(select_fields)])
 app.include_router(fcm_router, prefix='/api/fcm')
 app.include_router(university_router, prefix='/api/universities')
 app.include_router(auth_router, prefix='/api/auth')
 
 
+@app.on_event("startup")
+async def prepare_database():
+    await apply_raw_schema()
+    if not await TagCount.exists():
+        await rebuild_tag_counts()
+    if not await ClubStats.exists():
+        await rebuild_club_stats()
+
+
+@app.on_event("startup")
+async def warm_caches():
+    await language_packs.load()
+    await load_connection_graph()
+
+
+@app.on_event("startup")
+async def start_background_work():
+    run_in_background(run_periodically(sync_revoked_tokens, config.ADMIN_TOKEN_REVOCATION_SYNC_SECONDS))
+    run_in_background(run_periodically(user_writes.flush, config.USER_WRITE_BUFFER_MAX_DELAY_SECONDS))
+    # warm_caches already loaded the graph
+    run_in_background(run_periodically(
+        load_connection_graph, config.CONNECTION_GRAPH_RELOAD_SECONDS, start_after=config.CONNECTION_GRAPH_RELOAD_SECONDS
+    ))
+    for cleanup in ("cleanup_jobs", "cleanup_admin_tokens", "cleanup_fanouts", "trim_timelines"):
+        await schedule_recurring(cleanup, config.CLEANUP_INTERVAL_SECONDS)
+    await schedule_recurring("update_trending_scores", config.TRENDING_INTERVAL_SECONDS)
+    await schedule_recurring("resume_fanouts", config.NOTIFICATION_FANOUT_RESUME_SECONDS)
+    await schedule_recurring("rebuild_club_stats", config.CLUB_STATS_REBUILD_SECONDS)
+    run_in_background(run_scheduler())
+
+
+async def flush_write_buffers():
+    await user_writes.flush()
+
+
+# buffered writes must land before tortoise closes its connections on shutdown
+app.router.on_shutdown.insert(0, flush_write_buffers)
+
+
 # TODO: add email support
 # TODO: make foreign keys on delete logic
 # TODO: login url with redirect capabilities
 # TODO: change secret key with openssl rand -hex 32
-# TODO: add pagination capabilities for regular, randomized, recommended etc.
+# TODO: add randomized pagination
 # TODO: fetch user name and last name from email
 # TODO: apply ts vectors for search
-# TODO: implement a manual cronjob
 # TODO: check username if exists on google login
@@ -0,0 +1,71 @@
+"""
+Fires concurrent event check-ins at a running server, like attendees scanning the
+verification link at the door, and reports latency percentiles and status codes.
+
+Access tokens are signed with the configured SECRET_KEY for the users with ids
+first_user_id .. first_user_id + users - 1, which must exist. Requires httpx.
+
+    python -m benchmarks.checkin_load --base-url http://localhost:8000 --event-token <token> --users 1000
+"""
+from datetime import datetime, timedelta
+from statistics import quantiles
+from collections import Counter
+import argparse
+import asyncio
+import time
+
+from jose import jwt
+import httpx
+
+from app.settings import config
+
+
+def access_token(user_id: int) -> str:
+    return jwt.encode(
+        {"user_id": user_id, "exp": datetime.utcnow() + timedelta(hours=1)}, config.SECRET_KEY, config.JWT_ALGORITHM
+    )
+
+
+async def check_in(client: httpx.AsyncClient, url: str, token: str, start: asyncio.Event, results: list):
+    await start.wait()
+    began = time.perf_counter()
+    try:
+        response = await client.get(url, headers={"Authorization": f"Bearer {token}"})
+        status = response.status_code
+    except httpx.HTTPError as error:
+        status = type(error).__name__
+    results.append((status, (time.perf_counter() - began) * 1000))
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--event-token", required=True)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--first-user-id", type=int, default=1)
+    parser.add_argument("--rounds", type=int, default=2, help="later rounds hit already verified attendees")
+    args = parser.parse_args()
+
+    url = f"{args.base_url}/api/events/verify/{args.event_token}/"
+    tokens = [access_token(user_id) for user_id in range(args.first_user_id, args.first_user_id + args.users)]
+    limits = httpx.Limits(max_connections=args.users, max_keepalive_connections=args.users)
+    async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+        for round_number in range(1, args.rounds + 1):
+            start, results = asyncio.Event(), []
+            tasks = [asyncio.create_task(check_in(client, url, token, start, results)) for token in tokens]
+            await asyncio.sleep(0.1)
+            began = time.perf_counter()
+            start.set()
+            await asyncio.gather(*tasks)
+            elapsed = time.perf_counter() - began
+            latencies = sorted(latency for _, latency in results)
+            cuts = quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+            print(
+                f"round {round_number}: {len(results)} check-ins in {elapsed:.2f} s "
+                f"({len(results) / elapsed:.0f}/s), p50 {cuts[49]:.1f} ms, p95 {cuts[94]:.1f} ms, "
+                f"p99 {cuts[98]:.1f} ms, max {latencies[-1]:.1f} ms, statuses {dict(Counter(s for s, _ in results))}"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,69 @@
+"""
+Builds a synthetic ConnectionGraph with one million connections and times
+loading, mutual counts, second-degree candidates, suggestions and updates.
+
+    python -m benchmarks.connection_graph [--users 100000] [--edges 1000000]
+"""
+from statistics import mean, quantiles
+import argparse
+import random
+import time
+
+from app.applications.users.graph import ConnectionGraph
+
+
+def timed(label: str, func, repeat: int):
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        durations.append((time.perf_counter() - start) * 1000)
+    cuts = quantiles(durations, n=20) if len(durations) > 1 else durations * 19
+    p50, p95 = cuts[9], cuts[18]
+    print(f"{label:<24} mean {mean(durations):8.3f} ms  p50 {p50:8.3f} ms  p95 {p95:8.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--edges", type=int, default=1_000_000)
+    parser.add_argument("--universities", type=int, default=200)
+    parser.add_argument("--clubs", type=int, default=5_000)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    # skewed degrees, a few users have far more connections than the rest
+    weights = [1 / (rank + 1) ** 0.5 for rank in range(args.users)]
+    sources = rng.choices(range(1, args.users + 1), weights=weights, k=args.edges)
+    edges = [(a, rng.randint(1, args.users)) for a in sources]
+    edges = [(a, b) for a, b in edges if a != b]
+    blocks = [(rng.randint(1, args.users), rng.randint(1, args.users)) for _ in range(args.users // 100)]
+    universities = [(user, rng.randint(1, args.universities)) for user in range(1, args.users + 1)]
+    memberships = [(rng.randint(1, args.users), rng.randint(1, args.clubs)) for _ in range(args.users * 2)]
+
+    graph = ConnectionGraph()
+    start = time.perf_counter()
+    graph.load(edges, blocks, universities, memberships)
+    print(f"load {graph.edge_count()} edges in {time.perf_counter() - start:.2f} s")
+
+    users = [rng.randint(1, args.users) for _ in range(args.repeat)]
+    pairs = iter([(rng.randint(1, args.users), rng.randint(1, args.users)) for _ in range(args.repeat * 2)])
+    heavy = 1
+
+    timed("mutual_count", lambda: graph.mutual_count(*next(pairs)), args.repeat)
+    timed("mutual_counts (page 100)", lambda: graph.mutual_counts(
+        rng.choice(users), [rng.randint(1, args.users) for _ in range(100)]
+    ), args.repeat)
+    timed("second_degree", lambda: graph.second_degree(rng.choice(users)), args.repeat)
+    timed("second_degree (hub)", lambda: graph.second_degree(heavy), 10)
+    timed("suggestions top 50", lambda: graph.suggestions(rng.choice(users), 50), args.repeat)
+    timed("suggestions (hub)", lambda: graph.suggestions(heavy, 50), 10)
+    timed("connect + disconnect", lambda: (
+        graph.connect(*next(pairs)), graph.disconnect(rng.choice(users), rng.choice(users))
+    ), args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Compares encoding a serialized list page the default FastAPI way, jsonable_encoder
+followed by json.dumps, with the orjson path of FastJSONResponse.
+
+    python -m benchmarks.json_bench [--items 1000]
+"""
+from datetime import datetime, timedelta
+from statistics import mean
+from decimal import Decimal
+import argparse
+import random
+import time
+import json
+
+from fastapi.encoders import jsonable_encoder
+
+from app.core.base.responses import dumps
+
+
+def post(rng: random.Random, post_id: int) -> dict:
+    created = datetime(2024, 1, 1) + timedelta(seconds=rng.randrange(10_000_000))
+    return {
+        "id": post_id,
+        "title": f"Post {post_id}",
+        "content": "lorem ipsum dolor sit amet " * rng.randrange(1, 20),
+        "created_at": created,
+        "updated_at": created + timedelta(minutes=rng.randrange(600)),
+        "latitude": Decimal(f"{rng.uniform(40.8, 41.2):.6f}"),
+        "longitude": Decimal(f"{rng.uniform(28.8, 29.3):.6f}"),
+        "location_decription": None,
+        "posted_by_admin": False,
+        "is_anon": rng.random() < 0.1,
+        "media": [f"https://cdn.example.com/media/{post_id}-{index}.jpg" for index in range(rng.randrange(3))],
+        "request_data": {
+            "allowed_actions": {"can_hide": True, "can_update": False, "can_delete": False, "can_report": True},
+            "user_rate": rng.choice([None, 1.0, 4.5]),
+        },
+        "tags": [f"tag{rng.randrange(500)}" for _ in range(rng.randrange(5))],
+        "rate": rng.uniform(0, 5),
+        "comment_count": rng.randrange(100),
+        "rate_count": rng.randrange(100),
+        "author_user": {
+            "id": rng.randrange(100_000),
+            "username": f"user{rng.randrange(100_000)}",
+            "first_name": "Ada",
+            "last_name": "Lovelace",
+            "avatar": "https://cdn.example.com/media/avatar.jpg",
+        },
+    }
+
+
+def fastapi_json(content) -> bytes:
+    # what JSONResponse.render does after the jsonable_encoder pass of the route
+    return json.dumps(
+        jsonable_encoder(content), ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def measure(encode, content, repeat: int) -> list[float]:
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        encode(content)
+        durations.append((time.perf_counter() - start) * 1000)
+    return durations
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    rng = random.Random(1)
+    page = {"has_next": True, "count": args.items * 10, "results": [post(rng, index) for index in range(args.items)]}
+
+    assert json.loads(fastapi_json(page)) == json.loads(dumps(page))
+    for name, encode in (("jsonable_encoder + json", fastapi_json), ("orjson", dumps)):
+        durations = sorted(measure(encode, page, args.repeat))
+        print(
+            f"{name}: {args.items} items, {len(encode(page)) / 1024:.0f} KiB, "
+            f"mean {mean(durations):.2f} ms, min {durations[0]:.2f} ms, max {durations[-1]:.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
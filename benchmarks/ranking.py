@@ -0,0 +1,55 @@
+"""
+Times feature math, scoring and top-k selection of the recommended page mode
+on synthetic candidate sets.
+
+    python -m benchmarks.ranking [--candidates 10000]
+"""
+from statistics import mean
+import argparse
+import time
+import numpy as np
+
+from app.core.base.ranking import membership, recency, proximity, saturate, score, top_k
+from app.settings import config
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--candidates", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=100)
+    parser.add_argument("--window", type=int, default=config.RANKING_WINDOW_SIZE)
+    args = parser.parse_args()
+    rng = np.random.default_rng(1)
+    n = args.candidates
+
+    ids = np.arange(1, n + 1, dtype=np.int64)
+    created = time.time() - rng.uniform(0, 30 * 24 * 3600, n)
+    latitude, longitude = rng.uniform(40.8, 41.2, n), rng.uniform(28.8, 29.3, n)
+    latitude[rng.random(n) < 0.3] = np.nan
+    rates, rate_counts, comments = rng.uniform(0, 5, n), rng.poisson(3, n), rng.poisson(5, n)
+    categories, clubs, creators = rng.integers(1, 50, n), rng.integers(1, 2000, n), rng.integers(1, 100_000, n)
+    interests = set(rng.integers(1, 50, 5).tolist())
+    viewer_clubs = set(rng.integers(1, 2000, 10).tolist())
+    connections = set(rng.integers(1, 100_000, 300).tolist())
+
+    durations = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        features = {
+            "recency": recency(created, config.RANKING_HALF_LIFE_HOURS),
+            "rate": rates,
+            "rate_count": saturate(rate_counts),
+            "comments": saturate(comments),
+            "proximity": proximity(latitude, longitude, 41.0, 29.0, config.RANKING_DISTANCE_SCALE_KM),
+            "interest": membership(categories.astype(np.float64), interests),
+            "affinity": membership(creators.astype(np.float64), connections)
+            + membership(clubs.astype(np.float64), viewer_clubs),
+        }
+        window = top_k(ids, score(features, config.RANKING_WEIGHTS["Post"]), args.window)
+        durations.append((time.perf_counter() - start) * 1000)
+    print(f"{n} candidates, window {len(window)}: mean {mean(durations):.3f} ms, "
+          f"min {min(durations):.3f} ms, max {max(durations):.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+from datetime import datetime, timedelta, timezone
+import asyncio
+import math
+import os
+
+import pytest
+
+asyncpg = pytest.importorskip("asyncpg")
+pytest.importorskip("tortoise")
+
+from app.applications.interactions.utils import TRENDING_EVENTS_SQL, TRENDING_POSTS_SQL
+
+DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+pytestmark = pytest.mark.skipif(DATABASE_URL is None, reason="TEST_DATABASE_URL is not set")
+
+SCHEMA_SQL = '''
+CREATE TEMPORARY TABLE "events" ("id" bigint PRIMARY KEY, "created_at" timestamptz, "end_date" timestamptz);
+CREATE TEMPORARY TABLE "posts" ("id" bigint PRIMARY KEY, "created_at" timestamptz);
+CREATE TEMPORARY TABLE "attendees" ("event_id" bigint, "user_id" bigint);
+CREATE TEMPORARY TABLE "comments" ("post_id" bigint, "created_at" timestamptz);
+CREATE TEMPORARY TABLE "rates" ("item_type" text, "item_id" bigint, "created_at" timestamptz);
+CREATE TEMPORARY TABLE "trending_scores" (
+    "item_type" text, "item_id" bigint, "score" float8, "interactions" bigint, "updated_at" timestamptz,
+    UNIQUE ("item_type", "item_id")
+);
+'''
+
+
+async def scores(sql: str, seed: str, params: list) -> dict:
+    # temporary tables shadow the tables of the database for this connection only,
+    # the seed runs in one transaction so that every row gets the same now()
+    connection = await asyncpg.connect(DATABASE_URL)
+    try:
+        await connection.execute(SCHEMA_SQL)
+        await connection.execute(seed)
+        await connection.execute(sql, *params)
+        return dict(await connection.fetch('SELECT "item_id", "score" FROM "trending_scores"'))
+    finally:
+        await connection.close()
+
+
+def test_fractional_attendee_weight_changes_event_score():
+    seed = '''
+    INSERT INTO "events" VALUES (1, now(), now() + interval '1 day'), (2, now(), now() + interval '1 day');
+    INSERT INTO "attendees" VALUES (1, 1), (1, 2);
+    INSERT INTO "rates" VALUES ('Event', 1, now());
+    '''
+    result = asyncio.run(scores(TRENDING_EVENTS_SQL, seed, [1.5, 1.0, 43200, 336]))
+    assert result[1] - result[2] == pytest.approx(math.log(1 + 1.5 * 2 + 1.0 * 1))
+
+
+def test_fractional_rate_weight_changes_post_score():
+    seed = '''
+    INSERT INTO "posts" VALUES (1, now()), (2, now());
+    INSERT INTO "rates" VALUES ('Post', 1, now()), ('Post', 2, now());
+    INSERT INTO "comments" VALUES (1, now());
+    '''
+    since = datetime.now(timezone.utc) - timedelta(hours=1)
+    result = asyncio.run(scores(TRENDING_POSTS_SQL, seed, [since, 0.5, 2.0, 43200, 336]))
+    assert result[1] - result[2] == pytest.approx(math.log(1 + 0.5 + 2.0) - math.log(1 + 0.5))
@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("asyncpg")
+pytest.importorskip("tortoise")
+
+from tortoise.exceptions import OperationalError
+from asyncpg.exceptions import DataError
+
+from app.core.base.write_buffer import WriteBehindBuffer
+
+
+class Item:
+    pass
+
+
+class RecordingBuffer(WriteBehindBuffer):
+    """
+    Writes into a dict, a statement holding a value above the limit fails
+    the way the asyncpg client of tortoise reports an out of range value
+    """
+
+    def __init__(self):
+        super().__init__(Item, {"score": "smallint"}, max_entries=100)
+        self.rows: dict = {}
+
+    async def write(self, columns, rows):
+        if any(values["score"] > 32767 for _, values in rows):
+            try:
+                raise DataError("value out of range for type smallint")
+            except DataError as error:
+                raise OperationalError(error) from error
+        for pk, values in rows:
+            self.rows[pk] = values
+
+
+def test_flush_drops_only_the_row_with_a_bad_value():
+    buffer = RecordingBuffer()
+    buffer.record(1, score=10)
+    buffer.record(2, score=100000)
+    buffer.record(3, score=30)
+
+    asyncio.run(buffer.flush())
+
+    assert buffer.rows == {1: {"score": 10}, 3: {"score": 30}}
+    assert buffer.pending == {}
+
+
+def test_flush_requeues_rows_on_other_errors():
+    buffer = RecordingBuffer()
+
+    async def fail(columns, rows):
+        raise OperationalError("connection lost")
+
+    buffer.write = fail
+    buffer.record(1, score=10)
+
+    with pytest.raises(OperationalError):
+        asyncio.run(buffer.flush())
+    assert buffer.pending == {1: {"score": 10}}